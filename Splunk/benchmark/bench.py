@@ -0,0 +1,200 @@
+import argparse
+import csv
+import json
+import logging
+import pathlib
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_splunkd import MockSplunkd, make_self_signed_cert
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s.%(msecs)03dZ splunk_bench: %(levelname)s: %(message)s', datefmt='%Y-%m-%dT%H:%M:%S')
+
+SPLUNK_DIR = pathlib.Path(__file__).resolve().parent.parent
+SCRIPTS = {
+    "upload": SPLUNK_DIR / "lookups" / "splunk_rest_handler_upload_lookups.py",
+    "delete": SPLUNK_DIR / "lookups" / "splunk_rest_handler_delete_lookups.py",
+    "macros": SPLUNK_DIR / "macros" / "create_splunk_macros.py",
+    "pysplunk": SPLUNK_DIR / "pysplunk.py",
+}
+USERNAME, PASSWORD = "admin", "changeme"
+
+# Loads a script as a module, points its module-level settings (ips_and_orgs,
+# splunk_management_port) at the mock tenants and runs its entry point, so the
+# scripts are benchmarked unmodified. VmHWM is the child's own peak RSS; the
+# rusage from wait4 would also count memory inherited from this process at fork.
+RUNNER = """
+import atexit, importlib.util, json, sys
+path, patches, entry, rss_path = sys.argv[1], json.loads(sys.argv[2]), sys.argv[3], sys.argv[4]
+def record_rss():
+    with open("/proc/self/status") as status, open(rss_path, "w") as out:
+        out.write(next(line.split()[1] for line in status if line.startswith("VmHWM:")))
+atexit.register(record_rss)
+sys.argv = [path] + sys.argv[5:]
+sys.path.insert(0, str(__import__("pathlib").Path(path).parent))
+spec = importlib.util.spec_from_file_location("bench_target", path)
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+for name, value in patches.items():
+    setattr(module, name, value)
+eval(entry, vars(module))
+"""
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Splunk REST scripts against a local mock splunkd.")
+    parser.add_argument("--scripts", default=",".join(SCRIPTS), help=f"comma-separated subset of {', '.join(SCRIPTS)}")
+    parser.add_argument("--fleet-sizes", default="1,4,11", help="numbers of Splunk instances to run against (default: 1,4,11)")
+    parser.add_argument("--lookup-rows", default="1000,100000",
+                        help="rows per lookup file for the upload/delete runs (default: 1000,100000)")
+    parser.add_argument("--lookup-files", type=int, default=4, help="lookup files uploaded per instance (default: 4)")
+    parser.add_argument("--objects", type=int, default=50, help="macros / saved searches synced per instance (default: 50)")
+    parser.add_argument("--workers", type=int, default=8, help="--workers passed to every script (default: 8)")
+    parser.add_argument("--latency", type=float, default=0.0, help="mock latency per request in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="mock random extra latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock requests failed")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of mock requests answered 429")
+    parser.add_argument("--json", type=pathlib.Path, help="also write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def write_lookups(directory, files, rows):
+    directory.mkdir(parents=True, exist_ok=True)
+    for n in range(files):
+        with (directory / f"bench_lookup_{n}.csv").open("w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["indicator", "type", "description"])
+            for i in range(rows):
+                writer.writerow([f"198.51.{i // 256 % 256}.{i % 256}", "ip", f"bench row {i}, file {n}"])
+    return directory
+
+
+def write_macros(path, count):
+    macros = [{"name": f"bench_macro_{i}", "definition": f"index=bench_{i} sourcetype=*",
+               "description": "benchmark macro"} for i in range(count)]
+    path.write_text(json.dumps(macros), encoding="utf-8")
+    return path
+
+
+def write_savedsearches(directory, count):
+    directory.mkdir(parents=True, exist_ok=True)
+    searches = [{"name": f"bench_search_{i}", "search": f"index=bench_{i} | stats count",
+                 "cron_schedule": f"{i % 60} * * * *", "is_scheduled": "1"} for i in range(count)]
+    (directory / "bench.json").write_text(json.dumps(searches), encoding="utf-8")
+    return directory
+
+
+def scenario(script, workdir, hosts, port, args):
+    """Returns (module patches, entry expression, argv, stdin) that run script against hosts."""
+    orgs = [{"ip": host, "organization": f"org{i + 1}"} for i, host in enumerate(hosts)]
+    credentials = ",".join(f"{USERNAME},{PASSWORD},{org['organization']}" for org in orgs)
+    patches = {"ips_and_orgs": orgs, "splunk_management_port": str(port)}
+    if script == "upload":
+        # Definitions for every file, named after the file, default match settings.
+        stdin = "\n".join([credentials, "yes", "", "", "no"]) + "\n"
+        return patches, "main()", [str(workdir / "lookups"), "search", "--workers", str(args.workers)], stdin
+    if script == "delete":
+        names = workdir / "delete_names.txt"
+        names.write_text("bench_lookup_*\n", encoding="utf-8")
+        argv = ["search", "--names-file", str(names), "--type", "both", "--workers", str(args.workers)]
+        return patches, "main()", argv, credentials + "\n"
+    if script == "macros":
+        argv = ["search", "--macros-file", str(write_macros(workdir / "macros.json", args.objects)),
+                "--workers", str(args.workers)]
+        return patches, "main()", argv, credentials + "\n"
+    argv = ["sync", str(write_savedsearches(workdir / "savedsearches", args.objects)), "--port", str(port),
+            "--username", USERNAME, "--password", PASSWORD, "--workers", str(args.workers)]
+    for host in hosts:
+        argv += ["--host", host]
+    return {}, "run_sync(parse_args())", argv, ""
+
+
+def run_script(script, patches, entry, argv, stdin, log_path):
+    """Runs one script in a child process and returns (seconds, exit status, peak RSS in MB)."""
+    rss_path = log_path.with_suffix(".rss")
+    with open(log_path, "w", encoding="utf-8") as log:
+        started = time.monotonic()
+        process = subprocess.Popen(
+            [sys.executable, "-c", RUNNER, str(SCRIPTS[script]), json.dumps(patches), entry, str(rss_path)] + argv,
+            stdin=subprocess.PIPE, stdout=log, stderr=subprocess.STDOUT, text=True,
+        )
+        process.stdin.write(stdin)
+        process.stdin.close()
+        exit_code = process.wait()
+        elapsed = time.monotonic() - started
+    rss = int(rss_path.read_text()) / 1024 if rss_path.exists() else 0.0
+    return elapsed, exit_code, rss
+
+
+def run_benchmarks(args):
+    scripts = [s.strip() for s in args.scripts.split(",") if s.strip()]
+    fleet_sizes = [int(n) for n in args.fleet_sizes.split(",")]
+    lookup_rows = [int(n) for n in args.lookup_rows.split(",")]
+    mock = MockSplunkd(args.latency, args.jitter, args.error_rate, throttle_rate=args.throttle_rate)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = pathlib.Path(tmp)
+        port = mock.serve(0, max(fleet_sizes), *make_self_signed_cert(tmp))
+        try:
+            for fleet in fleet_sizes:
+                hosts = [f"127.0.0.{i + 1}" for i in range(fleet)]
+                runs = []
+                for rows in lookup_rows:
+                    # Delete cleans up exactly what the preceding upload created.
+                    runs += [(script, rows) for script in ("upload", "delete") if script in scripts]
+                runs += [(script, None) for script in ("macros", "pysplunk") if script in scripts]
+                for script, rows in runs:
+                    if script == "upload":
+                        mock.reset()
+                        write_lookups(workdir / "lookups", args.lookup_files, rows)
+                    mock.stats(reset=True)
+                    patches, entry, argv, stdin = scenario(script, workdir, hosts, port, args)
+                    log_path = workdir / f"{script}.log"
+                    elapsed, exit_code, rss = run_script(script, patches, entry, argv, stdin, log_path)
+                    stats = mock.stats(reset=True)
+                    errors = sum(count for status, count in stats["statuses"].items() if status >= 400)
+                    result = {
+                        "script": script,
+                        "fleet": fleet,
+                        "rows": rows,
+                        "seconds": round(elapsed, 2),
+                        "requests": stats["requests"],
+                        "ops_per_sec": round(stats["requests"] / elapsed, 1) if elapsed else 0.0,
+                        "p50_ms": stats["p50_ms"],
+                        "p99_ms": stats["p99_ms"],
+                        "errors": errors,
+                        "peak_rss_mb": round(rss, 1),
+                        "exit_code": exit_code,
+                    }
+                    if exit_code:
+                        logging.error(f"{script} exited with {exit_code}; last output:\n"
+                                      + "".join(log_path.read_text(encoding="utf-8").splitlines(True)[-20:]))
+                    logging.info(result)
+                    results.append(result)
+        finally:
+            mock.shutdown()
+    return results
+
+
+def print_table(results):
+    columns = ["script", "fleet", "rows", "seconds", "requests", "ops_per_sec", "p50_ms", "p99_ms", "errors", "peak_rss_mb"]
+    widths = {c: max(len(c), *(len(str(r[c] if r[c] is not None else "-")) for r in results)) for c in columns}
+    print("  ".join(c.rjust(widths[c]) for c in columns))
+    for result in results:
+        print("  ".join(str(result[c] if result[c] is not None else "-").rjust(widths[c]) for c in columns))
+
+
+def main():
+    args = parse_args()
+    results = run_benchmarks(args)
+    if results:
+        print_table(results)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+import argparse
+import json
+import logging
+import os
+import random
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+# Stand-in for splunkd's management port, covering just the REST endpoints the
+# lookup, macro and saved-search scripts use. Every tenant is a listener on its
+# own loopback address (127.0.0.1, 127.0.0.2, ...) with its own objects, so a
+# script's ips_and_orgs can point a whole fleet at one process.
+
+# Knowledge-object collections served under /services and /servicesNS/<owner>/<app>
+ENDPOINTS = ("data/lookup-table-files", "data/transforms/lookups", "configs/conf-macros", "saved/searches")
+LOOKUP_CONTENTS = "data/lookup_edit/lookup_contents"
+LOGIN = "auth/login"
+STATS = "/__mock/stats"
+
+
+class Tenant:
+    def __init__(self, host):
+        self.host = host
+        self.lock = threading.Lock()
+        self.objects = {endpoint: {} for endpoint in ENDPOINTS}
+        self.sessions = set()
+
+
+class MockSplunkd:
+    """Shared tenant state, fault settings and request statistics for every listener."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=500, throttle_rate=0.0, retry_after=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.tenants = {}
+        self.servers = []
+        self._stats_lock = threading.Lock()
+        self._durations = []
+        self._statuses = Counter()
+
+    def tenant(self, host):
+        return self.tenants.setdefault(host, Tenant(host))
+
+    def reset(self):
+        """Drops every tenant's objects and sessions, and the collected statistics."""
+        for host in list(self.tenants):
+            self.tenants[host] = Tenant(host)
+        self.stats(reset=True)
+
+    def record(self, elapsed, status):
+        with self._stats_lock:
+            self._durations.append(elapsed)
+            self._statuses[status] += 1
+
+    def stats(self, reset=False):
+        """Returns the request count, status counts and p50/p99 server-side latency (ms) since the last reset."""
+        with self._stats_lock:
+            durations = sorted(self._durations)
+            statuses = dict(self._statuses)
+            if reset:
+                self._durations = []
+                self._statuses = Counter()
+
+        def percentile(p):
+            if not durations:
+                return 0.0
+            return round(durations[min(len(durations) - 1, int(len(durations) * p))] * 1000, 2)
+
+        return {"requests": len(durations), "statuses": statuses, "p50_ms": percentile(0.50), "p99_ms": percentile(0.99)}
+
+    def serve(self, port=8089, tenants=1, certfile=None, keyfile=None):
+        """Starts one listener per tenant on 127.0.0.<n>:<port> (port 0 picks a free one) and returns the port."""
+        context = None
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+        for i in range(tenants):
+            server = ThreadingHTTPServer((f"127.0.0.{i + 1}", port), MockHandler)
+            server.daemon_threads = True
+            if context:
+                server.socket = context.wrap_socket(server.socket, server_side=True)
+            server.mock = self
+            server.tenant = self.tenant(f"127.0.0.{i + 1}")
+            port = server.server_address[1]
+            self.servers.append(server)
+            threading.Thread(target=server.serve_forever, name=f"tenant-{i + 1}", daemon=True).start()
+        logging.info(f"Serving {tenants} tenant(s) on 127.0.0.1-{tenants}:{port} ({'https' if context else 'http'})")
+        return port
+
+    def shutdown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.servers = []
+
+
+def make_self_signed_cert(directory):
+    """Writes a throwaway localhost certificate and key with the openssl CLI and returns their paths."""
+    certfile = os.path.join(directory, "mock_splunkd.pem")
+    keyfile = os.path.join(directory, "mock_splunkd.key")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost",
+         "-keyout", keyfile, "-out", certfile],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    return certfile, keyfile
+
+
+def _timestamp():
+    return time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+
+
+def _atom_feed(entries):
+    """Renders entries as the Atom XML splunklib expects when output_mode is not json."""
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:s="http://dev.splunk.com/ns/rest">']
+    for entry in entries:
+        keys = "".join(f'<s:key name="{escape(str(k))}">{escape(str(v))}</s:key>' for k, v in entry["content"].items())
+        parts.append(
+            f"<entry><title>{escape(entry['name'])}</title><id>{escape(entry['id'])}</id>"
+            f"<updated>{entry['updated']}</updated>"
+            f'<link href="{escape(entry["links"]["alternate"])}" rel="alternate"/>'
+            f'<content type="text/xml"><s:dict>{keys}</s:dict></content></entry>'
+        )
+    parts.append("</feed>")
+    return "".join(parts)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like splunkd
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.client_address[0]} -> {self.server.tenant.host}: {format % args}")
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def do_DELETE(self):
+        self.handle_request("DELETE")
+
+    def _read_body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                chunk = self.rfile.read(size + 2)[:size]
+                if not size:
+                    break
+                chunks.append(chunk)
+            return b"".join(chunks)
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _send(self, status, body="", content_type="application/json", headers=None):
+        if not isinstance(body, (str, bytes)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self.headers.get("Connection", "").lower() == "close":
+            # splunklib asks for Connection: Close and closes before reading unless the response says so too.
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+        self._status = status
+
+    def _send_entries(self, status, entries, params):
+        total = len(entries)
+        offset = int(params.get("offset") or 0)
+        count = int(params.get("count") or 0)
+        entries = entries[offset:offset + count] if count > 0 else entries[offset:]
+        if params.get("output_mode") == "json":
+            self._send(status, {"entry": entries, "paging": {"total": total, "offset": offset, "perPage": count}})
+        else:
+            self._send(status, _atom_feed(entries), content_type="text/xml")
+
+    def handle_request(self, method):
+        started = time.monotonic()
+        self._status = 500
+        mock = self.server.mock
+        try:
+            url = urllib.parse.urlsplit(self.path)
+            body = self._read_body()
+            params = {k: v[-1] for k, v in urllib.parse.parse_qs(url.query, keep_blank_values=True).items()}
+            if body and "application/json" not in self.headers.get("Content-Type", ""):
+                params.update({k: v[-1] for k, v in
+                               urllib.parse.parse_qs(body.decode("utf-8"), keep_blank_values=True).items()})
+
+            if url.path == STATS:
+                return self._send(200, mock.stats(reset=params.get("reset") == "1"))
+
+            delay = mock.latency + random.uniform(0, mock.jitter)
+            if delay:
+                time.sleep(delay)
+            if mock.throttle_rate and random.random() < mock.throttle_rate:
+                return self._send(429, {"messages": [{"type": "ERROR", "text": "Too many requests"}]},
+                                  headers={"Retry-After": str(mock.retry_after)})
+            if mock.error_rate and random.random() < mock.error_rate:
+                return self._send(mock.error_status, {"messages": [{"type": "ERROR", "text": "Injected failure"}]})
+
+            self.route(method, url.path, params, body)
+        except Exception as e:
+            logging.exception(f"{method} {self.path} failed")
+            self._send(500, {"messages": [{"type": "ERROR", "text": str(e)}]})
+        finally:
+            mock.record(time.monotonic() - started, self._status)
+
+    def route(self, method, path, params, body):
+        tenant = self.server.tenant
+        segments = [urllib.parse.unquote(s) for s in path.strip("/").split("/")]
+        if segments[:1] == ["servicesNS"] and len(segments) >= 3:
+            owner, app, rest = segments[1], segments[2], segments[3:]
+        elif segments[:1] == ["services"]:
+            owner, app, rest = "nobody", "search", segments[1:]
+        else:
+            return self._send(404, {"messages": [{"type": "ERROR", "text": f"Unknown path {path}"}]})
+        resource = "/".join(rest)
+
+        if resource == LOGIN and method == "POST":
+            if not params.get("username") or not params.get("password"):
+                return self._send(401, {"messages": [{"type": "WARN", "text": "Login failed"}]})
+            key = uuid.uuid4().hex
+            with tenant.lock:
+                tenant.sessions.add(key)
+            if params.get("output_mode") == "json":
+                return self._send(200, {"sessionKey": key})
+            return self._send(200, f"<response><sessionKey>{key}</sessionKey></response>", content_type="text/xml")
+
+        authorization = self.headers.get("Authorization", "")
+        if not authorization.startswith("Splunk ") or authorization[len("Splunk "):] not in tenant.sessions:
+            return self._send(401, {"messages": [{"type": "WARN", "text": "call not properly authenticated"}]})
+
+        if resource == LOOKUP_CONTENTS and method == "POST":
+            rows = json.loads(params.get("contents") or "[]")
+            app = params.get("namespace") or app
+            name = params.get("lookup_file")
+            with tenant.lock:
+                tenant.objects["data/lookup-table-files"][name] = self._entry(
+                    "data/lookup-table-files", name, "nobody", app,
+                    {"eai:data": f"$SPLUNK_HOME/etc/apps/{app}/lookups/{name}", "rows": len(rows)})
+            return self._send(200, "")
+
+        endpoint = next((e for e in ENDPOINTS if resource == e or resource.startswith(e + "/")), None)
+        if endpoint is None:
+            return self._send(404, {"messages": [{"type": "ERROR", "text": f"Unknown endpoint {resource}"}]})
+        name, _, action = resource[len(endpoint) + 1:].partition("/")
+        self.handle_objects(method, tenant, endpoint, owner, app, name, action, params)
+
+    def _entry(self, endpoint, name, owner, app, content, sharing="app"):
+        path = f"/servicesNS/{owner}/{app}/{endpoint}/{urllib.parse.quote(name, safe='')}"
+        return {
+            "name": name,
+            "id": f"https://{self.server.tenant.host}:{self.server.server_address[1]}{path}",
+            "updated": _timestamp(),
+            "links": {"alternate": path, "list": path, "edit": path, "remove": path},
+            "acl": {"app": app, "owner": owner, "sharing": sharing},
+            "content": content,
+        }
+
+    def handle_objects(self, method, tenant, endpoint, owner, app, name, action, params):
+        fields = {k: v for k, v in params.items() if k not in ("name", "output_mode", "count", "f", "search", "offset")}
+        if not name and method == "GET":
+            # Listings are rendered outside the lock so concurrent page requests are served in parallel.
+            with tenant.lock:
+                entries = [e for e in tenant.objects[endpoint].values() if app == "-" or e["acl"]["app"] == app
+                           or e["acl"]["sharing"] == "global"]
+            return self._send_entries(200, entries, params)
+        with tenant.lock:
+            objects = tenant.objects[endpoint]
+            existing = objects.get(name)
+            if not name:
+                if method == "POST":
+                    name = params.get("name")
+                    if not name:
+                        return self._send(400, {"messages": [{"type": "ERROR", "text": "Missing name"}]})
+                    if name in objects:
+                        return self._send(409, {"messages": [{"type": "ERROR", "text": f"{name} already exists"}]})
+                    objects[name] = self._entry(endpoint, name, "nobody" if owner == "-" else owner, app, fields)
+                    return self._send_entries(201, [objects[name]], params)
+            elif existing is None:
+                return self._send(404, {"messages": [{"type": "ERROR", "text": f"Could not find object id={name}"}]})
+            elif action == "acl" and method == "POST":
+                existing["acl"].update({k: fields[k] for k in ("owner", "sharing") if k in fields})
+                return self._send_entries(200, [existing], params)
+            elif not action and method == "GET":
+                return self._send_entries(200, [existing], params)
+            elif not action and method == "POST":
+                existing["content"].update(fields)
+                existing["updated"] = _timestamp()
+                return self._send_entries(200, [existing], params)
+            elif not action and method == "DELETE":
+                del objects[name]
+                return self._send(200, {"entry": []})
+        self._send(405, {"messages": [{"type": "ERROR", "text": f"{method} not supported here"}]})
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local stand-in for splunkd's REST API.")
+    parser.add_argument("--port", type=int, default=8089, help="port every tenant listens on (default: 8089)")
+    parser.add_argument("--tenants", type=int, default=1,
+                        help="number of simulated Splunk instances, served on 127.0.0.1..127.0.0.N (default: 1)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response (default: 0)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency of up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failed with --error-status")
+    parser.add_argument("--error-status", type=int, default=500, help="status used for injected errors (default: 500)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of requests answered 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with 429s (default: 1)")
+    parser.add_argument("--certfile", help="TLS certificate; a throwaway self-signed one is generated when omitted")
+    parser.add_argument("--keyfile", help="TLS private key for --certfile")
+    return parser.parse_args(argv)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s.%(msecs)03dZ mock_splunkd: %(levelname)s: %(message)s', datefmt='%Y-%m-%dT%H:%M:%S')
+    args = parse_args()
+    mock = MockSplunkd(args.latency, args.jitter, args.error_rate, args.error_status, args.throttle_rate, args.retry_after)
+    certfile, keyfile = args.certfile, args.keyfile
+    with tempfile.TemporaryDirectory() as tmp:
+        if not certfile:
+            certfile, keyfile = make_self_signed_cert(tmp)
+        mock.serve(args.port, args.tenants, certfile, keyfile)
+        try:
+            while True:
+                time.sleep(60)
+                logging.info(f"Stats: {mock.stats()}")
+        except KeyboardInterrupt:
+            mock.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import csv
+import hashlib
+import heapq
+import ipaddress
+import logging
+import os
+import re
+import tempfile
+import urllib.parse
+
+# Normalization and de-duplication of IOC lookup rows before upload.
+#
+# Every cell is trimmed. In the indicator columns (--normalize-column, by
+# default the --dedup-key columns) values that are indicators once refanged
+# (hxxp://, example[.]com, user[at]example.com, ...) are refanged, so they
+# match real log data. Case-insensitive indicators (domains, e-mail addresses,
+# hashes, URL scheme and host) are lower-cased, IP addresses and CIDRs are put
+# in canonical form, and other text is only trimmed. Other columns (malware
+# family, description, ...) are only trimmed, so 'Trojan.Win32' keeps its case.
+# Duplicate rows are dropped, comparing either the whole row or just
+# the --dedup-key columns, and the first occurrence wins. Files that fit in the
+# memory budget are de-duplicated in one pass with a set of row digests, which
+# keeps input order. Larger files go through a disk-backed external merge sort:
+# sorted runs in a temp directory merged with heapq.merge, so the output is
+# ordered by key.
+
+MERGE_FAN_IN = 64  # runs merged at once; more runs are merged in several passes
+ROW_OVERHEAD = 100  # rough per-row / per-cell Python object overhead used to size sort runs
+
+_REFANG = [
+    (re.compile(r"^h[xX]{2}p(s?)(?=:|\[:\]|\[://\])", re.IGNORECASE), r"http\1"),
+    (re.compile(r"^f[xX]p(?=:|\[:\]|\[://\])", re.IGNORECASE), "ftp"),
+    (re.compile(r"\[://\]"), "://"),
+    (re.compile(r"\[:\]"), ":"),
+    (re.compile(r"\[\.\]|\(\.\)|\{\.\}|\[dot\]|\(dot\)", re.IGNORECASE), "."),
+    (re.compile(r"\[@\]|\[at\]|\(at\)", re.IGNORECASE), "@"),
+]
+_HASH = re.compile(r"^(?:[0-9a-fA-F]{32}|[0-9a-fA-F]{40}|[0-9a-fA-F]{64}|[0-9a-fA-F]{128})$")
+_DOMAIN = re.compile(r"^(?:\*\.)?(?:[A-Za-z0-9_](?:[A-Za-z0-9_-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z][A-Za-z0-9-]{1,62}\.?$")
+_EMAIL = re.compile(r"^[^@\s]+@(?:[A-Za-z0-9-]+\.)+[A-Za-z]{2,}$")
+_URL = re.compile(r"^[A-Za-z][A-Za-z0-9+.-]*://\S+$")
+_INVISIBLE = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u2060\ufeff"))  # zero-width characters feeds leave behind
+
+
+def refang(value):
+    for pattern, replacement in _REFANG:
+        value = pattern.sub(replacement, value)
+    return value
+
+
+def _normalize_indicator(value):
+    """Returns the canonical form of value if it is a case-insensitive indicator, else None."""
+    if _HASH.match(value) or _EMAIL.match(value):
+        return value.lower()
+    if _DOMAIN.match(value) and not value.replace(".", "").isdigit():
+        return value.lower().rstrip(".")
+    if _URL.match(value):
+        parts = urllib.parse.urlsplit(value)
+        return urllib.parse.urlunsplit(parts._replace(scheme=parts.scheme.lower(), netloc=parts.netloc.lower()))
+    try:
+        return str(ipaddress.ip_network(value) if "/" in value else ipaddress.ip_address(value))
+    except ValueError:
+        return None
+
+
+def trim_value(value):
+    return value.translate(_INVISIBLE).strip()
+
+
+def normalize_value(value):
+    value = trim_value(value)
+    if not value:
+        return value
+    refanged = refang(value)
+    normalized = _normalize_indicator(refanged)
+    if normalized is not None:
+        return normalized
+    # Refanging only applies to things that turn out to be indicators; leave other text as it was.
+    return value
+
+
+def normalize_row(row, columns=None):
+    """Normalizes the cells at the columns indexes (every cell when None) and trims the rest."""
+    if columns is None:
+        return [normalize_value(cell) for cell in row]
+    return [normalize_value(cell) if i in columns else trim_value(cell) for i, cell in enumerate(row)]
+
+
+def _row_key(row, key_columns):
+    return "\x1f".join(row[i] for i in key_columns) if key_columns else "\x1f".join(row)
+
+
+def _dedup_in_memory(rows, key_columns):
+    seen = set()
+    for row in rows:
+        digest = hashlib.blake2b(_row_key(row, key_columns).encode("utf-8"), digest_size=16).digest()
+        if digest not in seen:
+            seen.add(digest)
+            yield row
+
+
+def _write_run(run, tmp_dir):
+    run.sort(key=lambda item: (item[0], item[1]))
+    fd, path = tempfile.mkstemp(prefix="ioc_run_", suffix=".csv", dir=tmp_dir)
+    with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        for key, seq, row in run:
+            writer.writerow([key, seq] + row)
+    return path
+
+
+def _read_run(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        for record in csv.reader(f):
+            yield record[0], int(record[1]), record[2:]
+
+
+def _merge_runs(paths, tmp_dir):
+    """Merges sorted runs down to at most MERGE_FAN_IN files, MERGE_FAN_IN at a time."""
+    while len(paths) > MERGE_FAN_IN:
+        group, paths = paths[:MERGE_FAN_IN], paths[MERGE_FAN_IN:]
+        merged = heapq.merge(*(_read_run(p) for p in group), key=lambda item: (item[0], item[1]))
+        fd, path = tempfile.mkstemp(prefix="ioc_run_", suffix=".csv", dir=tmp_dir)
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            for key, seq, row in merged:
+                writer.writerow([key, seq] + row)
+        for p in group:
+            os.remove(p)
+        paths.append(path)
+    return paths
+
+
+def _dedup_external(rows, key_columns, memory_limit, tmp_dir):
+    with tempfile.TemporaryDirectory(prefix="ioc_sort_", dir=tmp_dir) as sort_dir:
+        paths = []
+        run = []
+        run_bytes = 0
+        for seq, row in enumerate(rows):
+            key = _row_key(row, key_columns)
+            run.append((key, seq, row))
+            run_bytes += ROW_OVERHEAD + len(key) + sum(len(cell) + ROW_OVERHEAD for cell in row)
+            if run_bytes >= memory_limit:
+                paths.append(_write_run(run, sort_dir))
+                run = []
+                run_bytes = 0
+        if run:
+            paths.append(_write_run(run, sort_dir))
+        logging.info(f"External sort: {len(paths)} run(s) in {sort_dir}")
+        previous = None
+        for key, _, row in heapq.merge(*(_read_run(p) for p in _merge_runs(paths, sort_dir)),
+                                       key=lambda item: (item[0], item[1])):
+            if key != previous:
+                previous = key
+                yield row
+
+
+def normalize_lookup(rows, out_path, size, key_columns=None, memory_limit=256 * 1024 * 1024, tmp_dir=None,
+                     normalize_columns=None):
+    """Writes the normalized, de-duplicated rows (header first) to out_path and returns row counts.
+
+    rows is an iterator over the source CSV rows, header included; size is the
+    source file size, used to choose between in-memory and external de-duplication.
+    key_columns are column names; when empty, the whole row is the key.
+    normalize_columns names the indicator columns to refang and canonicalize,
+    defaulting to key_columns; every other cell is only trimmed.
+    """
+    header = next(rows, None)
+    if header is None:
+        open(out_path, "w").close()
+        return {"rows_in": 0, "rows_out": 0, "external": False}
+    header = [trim_value(cell) for cell in header]
+    indexes = []
+    for column in key_columns or []:
+        if column not in header:
+            raise ValueError(f"Dedup key column '{column}' is not in the header {header}")
+        indexes.append(header.index(column))
+    if normalize_columns is None:
+        normalize_columns = key_columns or []
+    indicator_indexes = set()
+    for column in normalize_columns:
+        if column not in header:
+            raise ValueError(f"Normalize column '{column}' is not in the header {header}")
+        indicator_indexes.add(header.index(column))
+
+    counts = {"rows_in": 0, "rows_out": 0, "external": size > memory_limit}
+
+    def normalized():
+        for row in rows:
+            counts["rows_in"] += 1
+            yield normalize_row(row, indicator_indexes)
+
+    if counts["external"]:
+        unique = _dedup_external(normalized(), indexes, memory_limit, tmp_dir)
+    else:
+        unique = _dedup_in_memory(normalized(), indexes)
+    with open(out_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for row in unique:
+            writer.writerow(row)
+            counts["rows_out"] += 1
+    return counts
@@ -1,14 +1,15 @@
+import argparse
+import fnmatch
 import json
-import requests
 import logging
 import getpass
 import pathlib
 import sys
-from requests.auth import HTTPBasicAuth
-from requests.packages.urllib3.exceptions import InsecureRequestWarning
 
-# Disable warning for insecure requests
-requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from splunk_inventory import add_inventory_arguments, fleet_targets
+from splunk_metrics import add_metrics_arguments, metrics_from_args
+from splunk_rest_client import HostPools, get_client
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s.%(msecs)03dZ splunk_rest_delete_lookups: %(levelname)s: %(message)s', datefmt='%Y-%m-%dT%H:%M:%S')
@@ -16,6 +17,12 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s.%(msecs)03dZ splunk_
 # Define Splunk details
 splunk_management_port = "8089"
 
+# REST collection for each kind of lookup object
+LOOKUP_ENDPOINTS = {
+    "file": "data/lookup-table-files",
+    "definition": "data/transforms/lookups",
+}
+
 # Example dictionary with IPs and their organizations
 ips_and_orgs = [
     {"ip": "192.168.1.0", "organization": "Org A"},
@@ -31,16 +38,6 @@ ips_and_orgs = [
     {"ip": "192.168.1.10", "organization": "Org K"}
 ]
 
-# Validate script arguments
-if len(sys.argv) != 2:
-    logging.critical("[!] Usage: python splunk_rest_handler_delete_lookups.py <splunk_app>")
-    logging.critical("[!] Examples for <splunk_app>: 'search', 'SplunkEnterpriseSecuritySuite', 'lookup_editor'")
-    sys.exit(1)
-
-# Get input arguments
-splunk_app = sys.argv[1]
-
-delete_status = []
 
 # Function to create delete status entry
 def create_delete_status(organization, lookup_file_or_definition, delete_success, is_definition=False):
@@ -51,64 +48,199 @@ def create_delete_status(organization, lookup_file_or_definition, delete_success
         "Delete_Status": "Success" if delete_success else "Failed",
     }
 
-# Prompt user for credentials
-credentials_input = input(
-    "Enter credentials in the format 'username,password,organization,' (e.g., user1,password1,org1,user2,password2,org2): "
-)
-credentials_list = credentials_input.strip().split(',')
-
-# Ask the user what type of lookup to delete
-delete_type = input(
-    "What do you want to delete? (Enter 'file' for lookup files, 'definition' for lookup definitions): "
-).strip().lower()
-
-if delete_type not in ["file", "definition"]:
-    logging.critical("[!] Invalid input. Please enter either 'file' or 'definition'.")
-    sys.exit(1)
-
-# Ask the user for the name of the lookup to delete
-lookup_name = input(f"Enter the name of the lookup {delete_type} you want to delete: ").strip()
-
-for i in range(0, len(credentials_list), 3):
-    username, password, org = credentials_list[i:i + 3]
-    matched_org = next((entry for entry in ips_and_orgs if entry["organization"] == org), None)
-
-    if not matched_org:
-        logging.error(f"No matching organization found for: {org}")
-        delete_status.append(create_delete_status(org, lookup_name, False, is_definition=(delete_type == "definition")))
-        continue
-
-    ip = matched_org["ip"]
-    logging.info(f"Found IP {ip} for organization {org}. Proceeding with deletion...")
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Delete lookup files or lookup definitions from Splunk.",
+        epilog="Examples for <splunk_app>: 'search', 'SplunkEnterpriseSecuritySuite', 'lookup_editor'",
+    )
+    parser.add_argument("splunk_app", nargs="?",
+                        help="Splunk app namespace to delete from (default: the organization's app in --inventory)")
+    parser.add_argument("--name", help="single mode: name of the lookup file or definition to delete (default: ask)")
+    parser.add_argument("--names-file", type=pathlib.Path,
+                        help="bulk mode: file with one lookup name or glob pattern per line (e.g. 'ioc_*.csv')")
+    parser.add_argument("--type", choices=["file", "definition", "both"],
+                        help="bulk mode: what to delete (default: ask)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="bulk mode: list what would be deleted in each organization without deleting anything")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="bulk mode: number of DELETE requests run concurrently (default: 8)")
+    parser.add_argument("--per-host", type=int, default=4,
+                        help="bulk mode: maximum concurrent DELETE requests against a single Splunk host (default: 4)")
+    add_inventory_arguments(parser)
+    add_metrics_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def read_patterns(names_file):
+    patterns = []
+    with names_file.open(encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                patterns.append(line)
+    return patterns
+
+
+def list_lookups(client, splunk_app, delete_type):
+    """Lists every lookup file or definition owned by splunk_app in a single request."""
+    response = client.get(
+        f"/servicesNS/-/{splunk_app}/{LOOKUP_ENDPOINTS[delete_type]}",
+        params={"output_mode": "json", "count": 0},
+    )
+    response.raise_for_status()
+    lookups = {}
+    for entry in response.json().get("entry", []):
+        # Globally shared objects from other apps show up too; only touch this app's own.
+        if entry.get("acl", {}).get("app") != splunk_app:
+            continue
+        remove = entry.get("links", {}).get("remove")
+        lookups[entry["name"]] = remove or f"/servicesNS/admin/{splunk_app}/{LOOKUP_ENDPOINTS[delete_type]}/{entry['name']}"
+    return lookups
+
+
+def plan_deletions(client, org, splunk_app, delete_types, patterns):
+    """Returns [(delete_type, name, url)] for every listed lookup matching one of the patterns."""
+    plan = []
+    for delete_type in delete_types:
+        lookups = list_lookups(client, splunk_app, delete_type)
+        matched = set()
+        for pattern in patterns:
+            names = fnmatch.filter(lookups, pattern)
+            if not names:
+                logging.warning(f"No {delete_type} matching '{pattern}' in {org}")
+            matched.update(names)
+        plan.extend((delete_type, name, lookups[name]) for name in sorted(matched))
+    return plan
+
+
+def delete_lookup(client, org, delete_type, name, url):
     try:
-        # Set the URL based on whether we're deleting a file or definition
-        if delete_type == "file":
-            delete_url = f"https://{ip}:{splunk_management_port}/servicesNS/admin/{splunk_app}/data/lookup-table-files/{lookup_name}"
-        else:  # definition
-            delete_url = f"https://{ip}:{splunk_management_port}/servicesNS/admin/{splunk_app}/data/transforms/lookups/{lookup_name}"
-
-        # Perform the DELETE request
-        response = requests.delete(
-            delete_url,
-            auth=HTTPBasicAuth(username, password),
-            verify=False,
-        )
-
+        response = client.delete(url)
         delete_success = response.status_code == 200
         if delete_success:
-            logging.info(f"[Success] {delete_type.capitalize()} '{lookup_name}' deleted successfully for {org}.")
+            logging.info(f"[Success] {delete_type.capitalize()} '{name}' deleted successfully for {org}.")
         else:
-            logging.error(
-                f"[Failed] Could not delete {delete_type} '{lookup_name}' for {org}: {response.text}"
-            )
-
-        delete_status.append(create_delete_status(org, lookup_name, delete_success, is_definition=(delete_type == "definition")))
-
+            logging.error(f"[Failed] Could not delete {delete_type} '{name}' for {org}: {response.text}")
     except Exception as e:
-        logging.error(f"An error occurred during deletion for {org}: {e}")
-        delete_status.append(create_delete_status(org, lookup_name, False, is_definition=(delete_type == "definition")))
-
-# Output all delete statuses
-for status in delete_status:
-    logging.info(f"{status}")
+        logging.error(f"An error occurred during deletion of '{name}' for {org}: {e}")
+        delete_success = False
+    return create_delete_status(org, name, delete_success, is_definition=(delete_type == "definition"))
+
+
+def bulk_delete(orgs, delete_types, patterns, args):
+    """orgs maps each organization to its (client, splunk_app)."""
+    delete_status = []
+    # One pool per host, so a host at its --per-host limit never holds workers the other hosts could use.
+    with HostPools(args.workers, args.per_host, thread_name_prefix="delete") as pool:
+        # One listing per org and type, fetched for all orgs at once.
+        plans = {org: pool.submit(client.host, plan_deletions, client, org, splunk_app, delete_types, patterns)
+                 for org, (client, splunk_app) in orgs.items()}
+
+        results = []
+        for org, future in plans.items():
+            try:
+                plan = future.result()
+            except Exception as e:
+                logging.error(f"Could not list lookups for {org}: {e}")
+                delete_status.append(create_delete_status(org, ", ".join(patterns), False))
+                continue
+
+            logging.info(f"{org}: {len(plan)} lookup object(s) to delete")
+            for delete_type, name, url in plan:
+                logging.info(f"{'[Dry-run] ' if args.dry_run else ''}{org}: delete {delete_type} '{name}'")
+            if args.dry_run:
+                continue
+
+            client = orgs[org][0]
+            for delete_type, name, url in plan:
+                results.append(pool.submit(client.host, delete_lookup, client, org, delete_type, name, url))
+
+        delete_status.extend(future.result() for future in results)
+    return delete_status
+
+
+def main():
+    args = parse_args()
+
+    # Get input arguments
+    splunk_app = args.splunk_app
+
+    delete_status = []
+
+    # Credentials from the environment / credentials file, or prompted for
+    targets = fleet_targets(args, ips_and_orgs, splunk_management_port, splunk_app)
+
+    # Ask the user what type of lookup to delete
+    delete_type = args.type or input(
+        "What do you want to delete? (Enter 'file' for lookup files, 'definition' for lookup definitions): "
+    ).strip().lower()
+
+    if delete_type not in ["file", "definition"] and not (args.names_file and delete_type == "both"):
+        logging.critical("[!] Invalid input. Please enter either 'file' or 'definition'.")
+        sys.exit(1)
+
+    metrics = metrics_from_args(args, "delete_lookups")
+
+    if args.names_file:
+        patterns = read_patterns(args.names_file)
+        orgs = {}
+        for org, matched_org, username, password in targets:
+            if not matched_org:
+                delete_status.append(create_delete_status(org, ", ".join(patterns), False))
+                continue
+            if metrics:
+                metrics.name_host(matched_org["ip"], org)
+            orgs[org] = (get_client(matched_org["ip"], matched_org["port"], username, password,
+                                    pool_size=max(1, args.per_host), metrics=metrics), matched_org["app"])
+        delete_types = ["file", "definition"] if delete_type == "both" else [delete_type]
+        delete_status.extend(bulk_delete(orgs, delete_types, patterns, args))
+    else:
+        # Ask the user for the name of the lookup to delete
+        lookup_name = args.name or input(f"Enter the name of the lookup {delete_type} you want to delete: ").strip()
+
+        for org, matched_org, username, password in targets:
+            if not matched_org:
+                delete_status.append(create_delete_status(org, lookup_name, False, is_definition=(delete_type == "definition")))
+                continue
+
+            ip = matched_org["ip"]
+            logging.info(f"Found IP {ip} for organization {org}. Proceeding with deletion...")
+
+            try:
+                # Set the URL based on whether we're deleting a file or definition
+                if delete_type == "file":
+                    delete_url = f"/servicesNS/admin/{matched_org['app']}/data/lookup-table-files/{lookup_name}"
+                else:  # definition
+                    delete_url = f"/servicesNS/admin/{matched_org['app']}/data/transforms/lookups/{lookup_name}"
+
+                # Perform the DELETE request
+                if metrics:
+                    metrics.name_host(ip, org)
+                client = get_client(ip, matched_org["port"], username, password, metrics=metrics)
+                response = client.delete(delete_url)
+
+                delete_success = response.status_code == 200
+                if delete_success:
+                    logging.info(f"[Success] {delete_type.capitalize()} '{lookup_name}' deleted successfully for {org}.")
+                else:
+                    logging.error(
+                        f"[Failed] Could not delete {delete_type} '{lookup_name}' for {org}: {response.text}"
+                    )
+
+                delete_status.append(create_delete_status(org, lookup_name, delete_success, is_definition=(delete_type == "definition")))
+
+            except Exception as e:
+                logging.error(f"An error occurred during deletion for {org}: {e}")
+                delete_status.append(create_delete_status(org, lookup_name, False, is_definition=(delete_type == "definition")))
+
+    if metrics:
+        metrics.finish(args.metrics_json, args.metrics_prom)
+
+    # Output all delete statuses
+    for status in delete_status:
+        logging.info(f"{status}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,40 @@
+import argparse
+import csv
+import hashlib
 import json
-import requests
+import os
 import logging
 import getpass
 import pathlib
+import re
+import shutil
+import sqlite3
 import sys
-from requests.auth import HTTPBasicAuth
-from requests.packages.urllib3.exceptions import InsecureRequestWarning
+import tempfile
+import urllib.parse
+import uuid
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
-# Disable warning for insecure requests
-requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from ioc_normalizer import normalize_lookup
+from splunk_inventory import add_inventory_arguments, fleet_targets
+from splunk_metrics import add_metrics_arguments, metrics_from_args
+from splunk_rest_client import HostPools, get_client
 
 # Setup logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s.%(msecs)03dZ splunk_rest_upload_lookups: %(levelname)s: %(message)s', datefmt='%Y-%m-%dT%H:%M:%S')
+logging.basicConfig(level=logging.INFO, format='%(asctime)s.%(msecs)03dZ splunk_rest_upload_lookups: %(levelname)s: %(threadName)s: %(message)s', datefmt='%Y-%m-%dT%H:%M:%S')
 
 # Define Splunk details
 splunk_management_service = "/services/data/lookup_edit/lookup_contents"  # Endpoint for the lookup-editor
 splunk_management_port = "8089"
 
+# Marks a step skipped by --sync because nothing changed since the last run
+UNCHANGED = "Unchanged"
+
+# Permissions applied to every lookup definition
+LOOKUP_ACL = {"sharing": "global", "owner": "nobody"}
+
 # Example dictionary with IPs and their organizations
 ips_and_orgs = [
     {"ip": "192.168.1.0", "organization": "Org A"},
@@ -32,144 +50,719 @@ ips_and_orgs = [
     {"ip": "192.168.1.10", "organization": "Org K"}
 ]
 
-# Validate script arguments
-if len(sys.argv) != 3:
-    logging.critical("[!] Usage: python .\splunk_rest_handler_upload_lookups.py <lookup_file_or_directory> <splunk_app>")
-    logging.critical("[!] Examples for <splunk_app>: 'search', 'SplunkEnterpriseSecuritySuite', 'lookup_editor'")
-    sys.exit(1)
-
-# Get input arguments
-lookup_path = pathlib.Path(sys.argv[1])
-splunk_app = sys.argv[2]
-
-# Check if the provided path is a file or directory
-if lookup_path.is_file():
-    csv_files = [lookup_path]
-elif lookup_path.is_dir():
-    csv_files = list(lookup_path.glob("*.csv"))
-    if not csv_files:
-        logging.error(f"No CSV files found in directory: {lookup_path}")
-        sys.exit(1)
-else:
-    logging.error(f"Invalid path: {lookup_path}")
-    sys.exit(1)
-
-upload_status = []
 
 # Function to create an upload status entry
 def create_upload_status(organization, csv_file, upload_success, definition_success=None):
     return {
         "Organization": organization,
         "CSV_File": csv_file.name if csv_file else "N/A",
-        "Upload_Status": "Success" if upload_success else "Failed",
-        "Lookup_Definition_Status": "Success" if definition_success else ("N/A" if definition_success is None else "Failed")
+        "Upload_Status": UNCHANGED if upload_success == UNCHANGED else ("Success" if upload_success else "Failed"),
+        "Lookup_Definition_Status": UNCHANGED if definition_success == UNCHANGED else (
+            "Success" if definition_success else ("N/A" if definition_success is None else "Failed"))
     }
 
-# Prompt user for credentials
-credentials_input = input(
-    "Enter credentials in the format 'username,password,organization,' (e.g., user1,password1,org1,user2,password2,org2): "
-)
-credentials_list = credentials_input.strip().split(',')
 
-# Ask user once about lookup definition creation
-create_lookups = input("Do you want to create lookup definitions for all files? (yes/no): ").strip().lower()
-create_lookups_choice = create_lookups == "yes"
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Upload lookup CSV files to Splunk and optionally create lookup definitions.",
+        epilog="Examples for <splunk_app>: 'search', 'SplunkEnterpriseSecuritySuite', 'lookup_editor'",
+    )
+    parser.add_argument("lookup_path", type=pathlib.Path, help="CSV file or directory of CSV files")
+    parser.add_argument("splunk_app", nargs="?",
+                        help="Splunk app namespace to upload into (default: the organization's app in --inventory)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of (organization, file) uploads run concurrently (default: 1)")
+    parser.add_argument("--per-host", type=int, default=4,
+                        help="maximum concurrent uploads against a single Splunk host (default: 4)")
+    parser.add_argument("--sync", action="store_true",
+                        help="skip files, definitions and ACLs whose content has not changed since the last --sync run")
+    parser.add_argument("--state-file", default="lookup_sync_state.json",
+                        help="where --sync keeps content hashes per (org, app, lookup) (default: lookup_sync_state.json)")
+    parser.add_argument("--verify-remote", action="store_true",
+                        help="with --sync, also re-upload when the lookup is missing or was modified on the Splunk side")
+    parser.add_argument("--staging-dir",
+                        help="local mount of the server's lookup staging directory ($SPLUNK_HOME/var/run/splunk/lookup_tmp); "
+                             "files above --staging-threshold are copied there and registered via data/lookup-table-files. "
+                             "Single host only; use staging_dir in --inventory for several")
+    parser.add_argument("--staging-server-path", default="/opt/splunk/var/run/splunk/lookup_tmp",
+                        help="the same staging directory as seen by splunkd (default: /opt/splunk/var/run/splunk/lookup_tmp)")
+    parser.add_argument("--staging-threshold", type=int, default=100, metavar="MB",
+                        help="files larger than this use the staging upload when --staging-dir is set (default: 100)")
+    parser.add_argument("--backend", choices=["lookup", "kvstore"], default="lookup",
+                        help="lookup replaces the CSV file through the lookup editor; kvstore loads rows into a "
+                             "KV store collection named after the file (default: lookup)")
+    parser.add_argument("--key-field",
+                        help="kvstore: CSV column used as _key, so rows are upserted and unchanged rows are not sent")
+    parser.add_argument("--kv-parallel", type=int, default=4,
+                        help="kvstore: batch_save requests in flight per file (default: 4)")
+    parser.add_argument("--kv-state", default="kvstore_sync_state.sqlite",
+                        help="kvstore: local database of row hashes used with --key-field (default: kvstore_sync_state.sqlite)")
+    parser.add_argument("--definitions", choices=["yes", "no"],
+                        help="create lookup definitions for all files without asking (default: ask)")
+    parser.add_argument("--lookup-name", default="",
+                        help="with --definitions yes: definition name (default: the CSV filename)")
+    parser.add_argument("--match-type", default="", help="with --definitions yes: match type, e.g. WILDCARD(keyword)")
+    parser.add_argument("--case-sensitive", action="store_true", help="with --definitions yes: case-sensitive match")
+    parser.add_argument("--normalize", action="store_true",
+                        help="trim, refang and lower-case indicators and drop duplicate rows before uploading")
+    parser.add_argument("--dedup-key", action="append",
+                        help="with --normalize: column that identifies a row (repeatable; default: the whole row)")
+    parser.add_argument("--normalize-column", action="append",
+                        help="with --normalize: indicator column to refang and lower-case (repeatable; default: the "
+                             "--dedup-key columns); other columns are only trimmed")
+    parser.add_argument("--normalize-memory", type=int, default=256, metavar="MB",
+                        help="with --normalize: files larger than this are de-duplicated with an on-disk merge sort "
+                             "(default: 256)")
+    parser.add_argument("--normalize-dir",
+                        help="with --normalize: keep the normalized files here instead of a temporary directory")
+    add_inventory_arguments(parser)
+    add_metrics_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def collect_csv_files(lookup_path):
+    # Check if the provided path is a file or directory
+    if lookup_path.is_file():
+        return [lookup_path]
+    elif lookup_path.is_dir():
+        csv_files = sorted(lookup_path.glob("*.csv"))
+        if not csv_files:
+            logging.error(f"No CSV files found in directory: {lookup_path}")
+            sys.exit(1)
+        return csv_files
+    else:
+        logging.error(f"Invalid path: {lookup_path}")
+        sys.exit(1)
+
+
+def iter_lookup_rows(csv_file):
+    """Yields the CSV rows one at a time, checking every row has as many columns as the header."""
+    with csv_file.open(encoding="utf-8", errors="ignore", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        yield header
+        for row in reader:
+            if not row:
+                continue
+            if len(row) != len(header):
+                raise ValueError(
+                    f"{csv_file.name} line {reader.line_num}: expected {len(header)} columns, found {len(row)}"
+                )
+            yield row
+
+
+class LookupContentsBody:
+    """Form-encoded lookup_contents request body produced row by row.
+
+    The whole JSON table is never built in memory: a first pass validates the
+    CSV and measures the encoded size so the request goes out with a
+    Content-Length, then iteration re-reads the file and yields ~64 KB chunks.
+    """
 
-lookup_name = None
-match_type = None
-case_sensitive_match = None
+    chunk_size = 64 * 1024
 
-if create_lookups_choice:
-    lookup_name = input("Enter the name for the lookup definition (leave blank to use the CSV filename): ").strip()
-    match_type = input("Enter match type (e.g., WILDCARD(keyword)) or press Enter to use default: ").strip()
-    case_sensitive = input("Is case-sensitive match required? (yes/no): ").strip().lower()
-    case_sensitive_match = "1" if case_sensitive == "yes" else "0"
+    def __init__(self, csv_file, fields):
+        self.csv_file = csv_file
+        self.prefix = (urllib.parse.urlencode(fields) + "&contents=").encode("ascii")
+        self.length = sum(len(part) for part in self._parts())
 
-for i in range(0, len(credentials_list), 3):
-    username, password, org = credentials_list[i:i + 3]
-    matched_org = next((entry for entry in ips_and_orgs if entry["organization"] == org), None)
+    def _parts(self):
+        yield self.prefix
+        yield urllib.parse.quote_plus("[").encode("ascii")
+        for n, row in enumerate(iter_lookup_rows(self.csv_file)):
+            yield urllib.parse.quote_plus(("," if n else "") + json.dumps(row)).encode("ascii")
+        yield urllib.parse.quote_plus("]").encode("ascii")
 
-    if not matched_org:
-        logging.error(f"No matching organization found for: {org}")
-        upload_status.append(create_upload_status(org, None, False))
-        continue
+    def __len__(self):
+        return self.length
 
-    ip = matched_org["ip"]
-    logging.info(f"Found IP {ip} for organization {org}. Proceeding with login...")
+    def __iter__(self):
+        buffer = []
+        size = 0
+        for part in self._parts():
+            buffer.append(part)
+            size += len(part)
+            if size >= self.chunk_size:
+                yield b"".join(buffer)
+                buffer = []
+                size = 0
+        if buffer:
+            yield b"".join(buffer)
 
+
+def normalize_lookups(csv_files, out_dir, key_columns=None, memory_limit_mb=256, normalize_columns=None):
+    """Writes a normalized, de-duplicated copy of every lookup to out_dir.
+
+    Returns (new paths, source files that could not be normalized). A malformed file is logged and
+    skipped instead of stopping the run; main() reports it as Failed for every organization.
+    """
+    out_dir = pathlib.Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    normalized = []
+    failed = []
+    total_in = total_out = rows_in = rows_out = 0
     for csv_file in csv_files:
-        logging.info(f"Processing file: {csv_file} for {org}")
+        out_path = out_dir / csv_file.name
+        if out_path.resolve() == csv_file.resolve():
+            raise ValueError(f"--normalize-dir must not be the directory holding the source lookups: {out_dir}")
+        size = csv_file.stat().st_size
         try:
-            with csv_file.open(encoding="utf-8", errors="ignore") as f:
-                lookup_content = [row.strip().split(",") for row in f]
-
-            r = requests.post(
-                f"https://{ip}:{splunk_management_port}{splunk_management_service}",
-                verify=False,
-                auth=(username, password),
-                data={
-                    "output_mode": "json",
-                    "namespace": splunk_app,
-                    "lookup_file": csv_file.name,
-                    "contents": json.dumps(lookup_content)
-                },
-                timeout=60
+            counts = normalize_lookup(iter_lookup_rows(csv_file), out_path, size, key_columns,
+                                      memory_limit_mb * 1024 * 1024, out_dir, normalize_columns)
+        except ValueError as e:
+            logging.error(f"Could not normalize '{csv_file.name}', it will not be uploaded: {e}")
+            out_path.unlink(missing_ok=True)
+            failed.append(csv_file)
+            continue
+        out_size = out_path.stat().st_size
+        logging.info(
+            f"Normalized '{csv_file.name}': {counts['rows_in']} -> {counts['rows_out']} rows, "
+            f"{size} -> {out_size} bytes{' (external sort)' if counts['external'] else ''}"
+        )
+        total_in += size
+        total_out += out_size
+        rows_in += counts["rows_in"]
+        rows_out += counts["rows_out"]
+        normalized.append(out_path)
+    saved = total_in - total_out
+    logging.info(
+        f"Normalization: {rows_in} -> {rows_out} rows ({rows_in - rows_out} duplicates removed), "
+        f"{saved} bytes saved ({saved * 100 / total_in if total_in else 0:.1f}%)"
+    )
+    return normalized, failed
+
+
+def staging_settings(args, entry):
+    """Returns the staging settings for an organization: its inventory staging_dir / staging_server_path, else the
+    command line ones; None when neither sets a staging directory."""
+    staging_dir = entry.get("staging_dir") or args.staging_dir
+    if not staging_dir:
+        return None
+    return {
+        "dir": staging_dir,
+        "server_path": entry.get("staging_server_path") or args.staging_server_path,
+        "threshold": args.staging_threshold * 1024 * 1024,
+    }
+
+
+def stage_lookup(client, org, csv_file, splunk_app, staging):
+    """Copies a large lookup into the server's staging directory and registers it through data/lookup-table-files."""
+    for row in iter_lookup_rows(csv_file):
+        pass  # validate before anything lands on the server
+    # A name of its own per (organization, file), so concurrent uploads never overwrite a file splunkd is reading.
+    staged_name = f"{csv_file.stem}.{re.sub(r'[^A-Za-z0-9_-]', '_', org)}.{uuid.uuid4().hex[:12]}.csv"
+    staged_path = pathlib.Path(staging["dir"]) / staged_name
+    shutil.copyfile(csv_file, staged_path)
+    try:
+        server_path = f"{staging['server_path'].rstrip('/')}/{staged_name}"
+        url = f"/servicesNS/nobody/{splunk_app}/data/lookup-table-files"
+        r = client.post(url, data={"name": csv_file.name, "eai:data": server_path})
+        if r.status_code == 409:
+            # Existing lookup: point it at the new staged file instead.
+            r = client.post(f"{url}/{csv_file.name}", data={"eai:data": server_path})
+    finally:
+        # splunkd moves the file into the app when it registers it; remove whatever is left either way.
+        staged_path.unlink(missing_ok=True)
+    logging.info(f"Staged '{csv_file.name}' for {org} via lookup-table-files (status {r.status_code})")
+    return r.status_code in (200, 201)
+
+
+def upload_lookup(client, org, csv_file, splunk_app, staging=None):
+    try:
+        size = csv_file.stat().st_size
+        if staging and size > staging["threshold"]:
+            upload_success = stage_lookup(client, org, csv_file, splunk_app, staging)
+        else:
+            body = LookupContentsBody(csv_file, {
+                "output_mode": "json",
+                "namespace": splunk_app,
+                "lookup_file": csv_file.name,
+            })
+            r = client.post(
+                splunk_management_service,
+                # A callable body is rebuilt for every retry attempt.
+                data=lambda: body,
+                headers={"Content-Type": "application/x-www-form-urlencoded"},
+                # Allow roughly a second per MB on top of the usual read timeout for big lookups.
+                timeout=(10, 60 + size // (1024 * 1024)),
             )
             upload_success = r.status_code == 200
-            logging.info(
-                f"[{'success' if upload_success else 'failed'}] File '{csv_file.name}' uploaded for {org} with IP {ip}"
-            )
+        logging.info(
+            f"[{'success' if upload_success else 'failed'}] File '{csv_file.name}' uploaded for {org} with IP {client.host}"
+        )
+    except Exception as e:
+        logging.error(f"Error uploading file '{csv_file.name}' for {org}: {e}")
+        upload_success = False
+    return upload_success
+
+
+def lookup_definition_params(csv_file, definition):
+    return {
+        "name": definition["lookup_name"] or csv_file.stem,
+        "filename": csv_file.name,
+        "match_type": definition["match_type"],
+        "case_sensitive_match": definition["case_sensitive_match"],
+    }
+
+
+def create_lookup_definition(client, org, csv_file, splunk_app, definition):
+    data_create = lookup_definition_params(csv_file, definition)
+    current_lookup_name = data_create["name"]
+
+    url_create_lookup = f"/servicesNS/admin/{splunk_app}/data/transforms/lookups/"
+
+    definition_success = False
+    try:
+        response_create = client.post(url_create_lookup, data=data_create)
+        if response_create.status_code == 409:
+            # Already defined: update the existing stanza in place instead of failing.
+            data_update = {k: v for k, v in data_create.items() if k != "name"}
+            response_create = client.post(f"{url_create_lookup}{current_lookup_name}", data=data_update)
+            definition_success = response_create.status_code == 200
+        else:
+            definition_success = response_create.status_code == 201
+        if definition_success:
+            logging.info(f"Lookup definition '{current_lookup_name}' created successfully for {org}.")
+        else:
+            logging.error(f"Failed to create lookup definition '{current_lookup_name}' for {org}.")
+    except Exception as e:
+        logging.error(f"An error occurred during lookup definition creation: {e}")
+
+    # Modify permissions for lookup definition; a definition without its ACL counts as failed so --sync retries it.
+    return definition_success and set_lookup_acl(client, splunk_app, current_lookup_name)
+
+
+def set_lookup_acl(client, splunk_app, current_lookup_name):
+    url_modify_perms = f"/servicesNS/admin/{splunk_app}/data/transforms/lookups/{current_lookup_name}/acl"
+    try:
+        response_modify = client.post(url_modify_perms, data=LOOKUP_ACL)
+        if response_modify.status_code == 200:
+            logging.info(f"Permissions for '{current_lookup_name}' set to global.")
+            return True
+        logging.error(f"Failed to update permissions for '{current_lookup_name}'.")
+    except Exception as e:
+        logging.error(f"Error updating permissions for '{current_lookup_name}': {e}")
+    return False
+
+
+def file_digest(csv_file):
+    digest = hashlib.sha256()
+    with csv_file.open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def params_digest(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def load_sync_state(path):
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def save_sync_state(sync):
+    # Called from worker threads after every file; write-then-rename keeps the file whole.
+    with sync["lock"]:
+        tmp = sync["path"] + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(sync["state"], f, indent=1, sort_keys=True)
+        os.replace(tmp, sync["path"])
+
+
+def remote_lookup_updated(client, splunk_app, csv_file):
+    """Returns the lookup file's 'updated' timestamp on the server, or None when it does not exist."""
+    r = client.get(f"/servicesNS/-/{splunk_app}/data/lookup-table-files/{csv_file.name}",
+                   params={"output_mode": "json"})
+    if r.status_code == 404:
+        return None
+    r.raise_for_status()
+    return r.json()["entry"][0].get("updated")
+
+
+def sync_file(client, org, csv_file, splunk_app, definition, sync, staging=None):
+    key = f"{org}|{splunk_app}|{csv_file.name}"
+    with sync["lock"]:
+        entry = dict(sync["state"].get(key, {}))
+    digest = sync["digests"][csv_file]
+
+    upload_needed = entry.get("sha256") != digest
+    if not upload_needed and sync["verify_remote"]:
+        try:
+            remote_updated = remote_lookup_updated(client, splunk_app, csv_file)
+            upload_needed = remote_updated is None or remote_updated != entry.get("remote_updated")
+            if upload_needed:
+                logging.info(f"Lookup '{csv_file.name}' changed or missing on {org}; uploading again.")
         except Exception as e:
-            logging.error(f"Error uploading file '{csv_file.name}' for {org}: {e}")
-            upload_success = False
+            logging.error(f"Could not check remote state of '{csv_file.name}' for {org}: {e}")
+            upload_needed = True
 
-        definition_success = None
-        if create_lookups_choice:
-            current_lookup_name = lookup_name or csv_file.stem
+    if upload_needed:
+        upload_success = upload_lookup(client, org, csv_file, splunk_app, staging)
+        if upload_success:
+            entry["sha256"] = digest
+            if sync["verify_remote"]:
+                try:
+                    entry["remote_updated"] = remote_lookup_updated(client, splunk_app, csv_file)
+                except Exception as e:
+                    logging.error(f"Could not record remote state of '{csv_file.name}' for {org}: {e}")
+    else:
+        upload_success = UNCHANGED
+        logging.info(f"[unchanged] File '{csv_file.name}' already up to date for {org}")
 
-            url_create_lookup = f"https://{ip}:{splunk_management_port}/servicesNS/admin/{splunk_app}/data/transforms/lookups/"
-            data_create = {
-                "name": current_lookup_name,
-                "filename": csv_file.name,
-                "match_type": match_type,
-                "case_sensitive_match": case_sensitive_match,
-            }
+    definition_success = None
+    if definition:
+        definition_hash = params_digest([lookup_definition_params(csv_file, definition), LOOKUP_ACL])
+        if entry.get("definition") == definition_hash:
+            definition_success = UNCHANGED
+        else:
+            # create_lookup_definition re-applies the ACL whenever the definition is (re)written.
+            definition_success = create_lookup_definition(client, org, csv_file, splunk_app, definition)
+            if definition_success:
+                entry["definition"] = definition_hash
 
+    with sync["lock"]:
+        sync["state"][key] = entry
+    save_sync_state(sync)
+    return upload_success, definition_success
+
+
+def open_kv_state(path):
+    db = sqlite3.connect(path, check_same_thread=False)
+    db.execute("CREATE TABLE IF NOT EXISTS rows (scope TEXT, key TEXT, hash TEXT, PRIMARY KEY (scope, key))")
+    return {"db": db, "lock": threading.Lock()}
+
+
+def kv_batch_limit(client, kvstore):
+    """Returns the server's max_documents_per_batch_save, looked up once per host."""
+    with kvstore["lock"]:
+        if client.host in kvstore["limits"]:
+            return kvstore["limits"][client.host]
+    limit = 1000  # Splunk's default
+    try:
+        r = client.get("/services/configs/conf-limits/kvstore", params={"output_mode": "json"})
+        if r.status_code == 200:
+            limit = int(r.json()["entry"][0]["content"].get("max_documents_per_batch_save", limit))
+    except Exception as e:
+        logging.warning(f"Could not read max_documents_per_batch_save from {client.host}, using {limit}: {e}")
+    with kvstore["lock"]:
+        kvstore["limits"][client.host] = limit
+    return limit
+
+
+def ensure_kv_collection(client, org, splunk_app, collection, fields):
+    url = f"/servicesNS/nobody/{splunk_app}/storage/collections/config"
+    r = client.get(f"{url}/{collection}", params={"output_mode": "json"})
+    if r.status_code == 404:
+        r = client.post(url, data={"name": collection})
+        if r.status_code not in (200, 201):
+            raise RuntimeError(f"could not create KV store collection '{collection}': {r.status_code} {r.text}")
+        logging.info(f"KV store collection '{collection}' created for {org}.")
+
+    # transforms.conf definition so the collection can be used with | lookup / | inputlookup
+    url_create_lookup = f"/servicesNS/admin/{splunk_app}/data/transforms/lookups/"
+    data_create = {
+        "name": collection,
+        "external_type": "kvstore",
+        "collection": collection,
+        "fields_list": ",".join(["_key"] + [f for f in fields if f != "_key"]),
+    }
+    r = client.post(url_create_lookup, data=data_create)
+    if r.status_code == 409:
+        data_update = {k: v for k, v in data_create.items() if k != "name"}
+        r = client.post(f"{url_create_lookup}{collection}", data=data_update)
+    if r.status_code not in (200, 201):
+        logging.error(f"Failed to create KV store lookup definition '{collection}' for {org}.")
+        return False
+    return set_lookup_acl(client, splunk_app, collection)
+
+
+def kv_server_keys(client, splunk_app, collection, page_size=10000):
+    """Returns the set of _key values currently in a KV store collection, fetched page by page."""
+    url = f"/servicesNS/nobody/{splunk_app}/storage/collections/data/{collection}"
+    keys = set()
+    skip = 0
+    while True:
+        r = client.get(url, params={"output_mode": "json", "fields": "_key", "limit": page_size, "skip": skip})
+        if r.status_code != 200:
+            raise RuntimeError(f"could not list keys of '{collection}': {r.status_code} {r.text}")
+        page = r.json()
+        keys.update(doc["_key"] for doc in page)
+        if len(page) < page_size:
+            return keys
+        skip += page_size
+
+
+def reconcile_kv_state(client, splunk_app, collection, kvstore, scope):
+    """Forgets recorded rows whose key is no longer in the collection (emptied or recreated on the server, or a
+    state file from another machine), so those rows are sent again instead of being reported as unchanged."""
+    server_keys = kv_server_keys(client, splunk_app, collection)
+    db = kvstore["db"]
+    with kvstore["lock"]:
+        recorded = [key for (key,) in db.execute("SELECT key FROM rows WHERE scope = ?", (scope,))]
+        missing = [(scope, key) for key in recorded if key not in server_keys]
+        if missing:
+            db.executemany("DELETE FROM rows WHERE scope = ? AND key = ?", missing)
+            db.commit()
+    if missing:
+        logging.warning(f"{len(missing)} of {len(recorded)} recorded rows are missing from '{collection}'; resending them")
+
+
+def delete_kv_keys(client, splunk_app, collection, keys, chunk=500):
+    url = f"/servicesNS/nobody/{splunk_app}/storage/collections/data/{collection}"
+    for i in range(0, len(keys), chunk):
+        query = json.dumps({"_key": {"$in": keys[i:i + chunk]}})
+        r = client.delete(url, params={"query": query})
+        if r.status_code != 200:
+            raise RuntimeError(f"deleting retired rows returned {r.status_code}: {r.text}")
+    return len(keys)
+
+
+def iter_kv_changes(csv_file, key_field, kvstore, scope, seen_keys=None):
+    """Yields (document, row_hash) for rows that are new or changed since the last run; with key_field, every key in
+    the file is added to seen_keys."""
+    rows = iter_lookup_rows(csv_file)
+    header = next(rows, None)
+    if header is None:
+        return
+    if key_field and key_field not in header:
+        raise ValueError(f"{csv_file.name}: --key-field '{key_field}' is not a column")
+    db = kvstore["db"]
+    for row in rows:
+        doc = dict(zip(header, row))
+        if not key_field:
+            yield doc, None
+            continue
+        doc["_key"] = doc[key_field]
+        if seen_keys is not None:
+            seen_keys.add(doc["_key"])
+        row_hash = hashlib.sha1(json.dumps(row).encode("utf-8")).hexdigest()
+        with kvstore["lock"]:
+            known = db.execute("SELECT hash FROM rows WHERE scope = ? AND key = ?", (scope, doc["_key"])).fetchone()
+        if known is None or known[0] != row_hash:
+            yield doc, row_hash
+
+
+def kv_batch_save(client, splunk_app, collection, docs):
+    r = client.post(
+        f"/servicesNS/nobody/{splunk_app}/storage/collections/data/{collection}/batch_save",
+        data=json.dumps(docs),
+        headers={"Content-Type": "application/json"},
+    )
+    if r.status_code != 200:
+        raise RuntimeError(f"batch_save returned {r.status_code}: {r.text}")
+    return len(docs)
+
+
+def upload_kvstore(client, org, csv_file, splunk_app, definition, kvstore):
+    collection = (definition or {}).get("lookup_name") or csv_file.stem
+    scope = f"{org}|{splunk_app}|{collection}"
+    key_field = kvstore["key_field"]
+    try:
+        with csv_file.open(encoding="utf-8", errors="ignore", newline="") as f:
+            fields = next(csv.reader(f), [])
+        definition_success = ensure_kv_collection(client, org, splunk_app, collection, fields)
+        if not key_field:
+            # Without a key every run is a full load, so clear the old rows first.
+            client.delete(f"/servicesNS/nobody/{splunk_app}/storage/collections/data/{collection}")
+        else:
+            reconcile_kv_state(client, splunk_app, collection, kvstore, scope)
+        limit = kv_batch_limit(client, kvstore)
+    except Exception as e:
+        logging.error(f"Error preparing KV store collection '{collection}' for {org}: {e}")
+        return False, False
+
+    sent = 0
+    failed = 0
+    in_flight = {}
+    seen_keys = set()
+
+    def finish(done):
+        nonlocal sent, failed
+        for future in done:
+            hashes = in_flight.pop(future)
             try:
-                response_create = requests.post(
-                    url_create_lookup,
-                    data=data_create,
-                    auth=HTTPBasicAuth(username, password),
-                    verify=False
-                )
-                definition_success = response_create.status_code == 201
-                if definition_success:
-                    logging.info(f"Lookup definition '{current_lookup_name}' created successfully for {org}.")
-                else:
-                    logging.error(f"Failed to create lookup definition '{current_lookup_name}' for {org}.")
+                sent += future.result()
             except Exception as e:
-                logging.error(f"An error occurred during lookup definition creation: {e}")
+                failed += len(hashes)
+                logging.error(f"batch_save into '{collection}' failed for {org}: {e}")
+                continue
+            if key_field:
+                with kvstore["lock"]:
+                    kvstore["db"].executemany("INSERT OR REPLACE INTO rows (scope, key, hash) VALUES (?, ?, ?)",
+                                              [(scope, k, h) for k, h in hashes])
+                    kvstore["db"].commit()
 
-            # Modify permissions for lookup definition
-            if definition_success:
-                url_modify_perms = f"{url_create_lookup}{current_lookup_name}/acl"
-                data_modify_perms = {"sharing": "global", "owner": "nobody"}
-                try:
-                    response_modify = requests.post(
-                        url_modify_perms,
-                        data=data_modify_perms,
-                        auth=HTTPBasicAuth(username, password),
-                        verify=False
-                    )
-                    if response_modify.status_code == 200:
-                        logging.info(f"Permissions for '{current_lookup_name}' set to global.")
-                    else:
-                        logging.error(f"Failed to update permissions for '{current_lookup_name}'.")
-                except Exception as e:
-                    logging.error(f"Error updating permissions for '{current_lookup_name}': {e}")
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, kvstore["parallel"]), thread_name_prefix="batch_save") as pool:
+            batch = []
+            for doc, row_hash in iter_kv_changes(csv_file, key_field, kvstore, scope, seen_keys):
+                batch.append((doc, row_hash))
+                if len(batch) < limit:
+                    continue
+                # Keep at most --kv-parallel batches in memory/in flight.
+                if len(in_flight) >= kvstore["parallel"]:
+                    finish(wait(in_flight, return_when=FIRST_COMPLETED).done)
+                future = pool.submit(kv_batch_save, client, splunk_app, collection, [d for d, _ in batch])
+                in_flight[future] = [(d.get("_key"), h) for d, h in batch]
+                batch = []
+            if batch:
+                future = pool.submit(kv_batch_save, client, splunk_app, collection, [d for d, _ in batch])
+                in_flight[future] = [(d.get("_key"), h) for d, h in batch]
+            finish(wait(in_flight).done)
+    except Exception as e:
+        logging.error(f"Error loading '{csv_file.name}' into KV store for {org}: {e}")
+        finish(wait(in_flight).done)
+        return False, definition_success
+
+    if failed:
+        logging.error(f"[failed] {failed} rows of '{csv_file.name}' were not saved to '{collection}' for {org}")
+        return False, definition_success
+
+    deleted = 0
+    if key_field:
+        # Rows dropped from the CSV (retired indicators) must stop matching, so remove them from the collection too.
+        with kvstore["lock"]:
+            retired = [key for (key,) in kvstore["db"].execute("SELECT key FROM rows WHERE scope = ?", (scope,))
+                       if key not in seen_keys]
+        try:
+            deleted = delete_kv_keys(client, splunk_app, collection, retired)
+        except Exception as e:
+            logging.error(f"Error deleting retired rows from '{collection}' for {org}: {e}")
+            return False, definition_success
+        if retired:
+            with kvstore["lock"]:
+                kvstore["db"].executemany("DELETE FROM rows WHERE scope = ? AND key = ?",
+                                          [(scope, key) for key in retired])
+                kvstore["db"].commit()
+            logging.info(f"Deleted {deleted} rows no longer in '{csv_file.name}' from '{collection}' for {org}")
+
+    if sent == 0 and deleted == 0:
+        logging.info(f"[unchanged] KV store collection '{collection}' already up to date for {org}")
+        return UNCHANGED, definition_success
+    logging.info(f"[success] {sent} rows of '{csv_file.name}' saved to KV store collection '{collection}' for {org}")
+    return True, definition_success
+
+
+def process_file(client, org, csv_file, splunk_app, definition, sync=None, staging=None, kvstore=None):
+    # upload -> definition -> ACL stay strictly ordered for a file; HostPools
+    # only bounds how many files hit the same splunkd at once.
+    logging.info(f"Processing file: {csv_file} for {org}")
+    if kvstore is not None:
+        upload_success, definition_success = upload_kvstore(client, org, csv_file, splunk_app, definition, kvstore)
+        return create_upload_status(org, csv_file, upload_success, definition_success)
+    if sync is not None:
+        upload_success, definition_success = sync_file(client, org, csv_file, splunk_app, definition, sync, staging)
+        return create_upload_status(org, csv_file, upload_success, definition_success)
+
+    upload_success = upload_lookup(client, org, csv_file, splunk_app, staging)
+
+    definition_success = None
+    if definition:
+        definition_success = create_lookup_definition(client, org, csv_file, splunk_app, definition)
+
+    return create_upload_status(org, csv_file, upload_success, definition_success)
+
+
+def main():
+    args = parse_args()
+
+    # Get input arguments
+    csv_files = collect_csv_files(args.lookup_path)
+    splunk_app = args.splunk_app
+
+    # Credentials from the environment / credentials file, or prompted for
+    targets = fleet_targets(args, ips_and_orgs, splunk_management_port, splunk_app)
+    # A local mount is one host's lookup_tmp; other hosts need their own staging_dir in the inventory.
+    shared_staging_hosts = {entry["ip"] for _, entry, _, _ in targets if entry and not entry.get("staging_dir")}
+    if args.staging_dir and len(shared_staging_hosts) > 1:
+        logging.error(f"--staging-dir can only serve one Splunk host, but {len(shared_staging_hosts)} are targeted; "
+                      "set staging_dir (and staging_server_path) per organization in --inventory instead")
+        sys.exit(1)
+
+    definition = None
+    if args.definitions == "yes":
+        definition = {
+            "lookup_name": args.lookup_name,
+            "match_type": args.match_type,
+            "case_sensitive_match": "1" if args.case_sensitive else "0",
+        }
+    # Otherwise ask user once about lookup definition creation
+    elif args.definitions is None and input(
+            "Do you want to create lookup definitions for all files? (yes/no): ").strip().lower() == "yes":
+        lookup_name = input("Enter the name for the lookup definition (leave blank to use the CSV filename): ").strip()
+        match_type = input("Enter match type (e.g., WILDCARD(keyword)) or press Enter to use default: ").strip()
+        case_sensitive = input("Is case-sensitive match required? (yes/no): ").strip().lower()
+        definition = {
+            "lookup_name": lookup_name,
+            "match_type": match_type,
+            "case_sensitive_match": "1" if case_sensitive == "yes" else "0",
+        }
+
+    normalize_tmp = None
+    normalize_failed = []
+    if args.normalize:
+        if not args.normalize_dir:
+            normalize_tmp = tempfile.TemporaryDirectory(prefix="lookups_normalized_")
+        csv_files, normalize_failed = normalize_lookups(csv_files, args.normalize_dir or normalize_tmp.name,
+                                                        args.dedup_key, args.normalize_memory,
+                                                        args.normalize_column)
+
+    sync = None
+    if args.sync:
+        sync = {
+            "path": args.state_file,
+            "state": load_sync_state(args.state_file),
+            "digests": {csv_file: file_digest(csv_file) for csv_file in csv_files},
+            "verify_remote": args.verify_remote,
+            "lock": threading.Lock(),
+        }
+
+    kvstore = None
+    if args.backend == "kvstore":
+        kvstore = open_kv_state(args.kv_state)
+        kvstore.update({"key_field": args.key_field, "parallel": args.kv_parallel, "limits": {}})
+
+    metrics = metrics_from_args(args, "upload_lookups")
+    with HostPools(args.workers, args.per_host, thread_name_prefix="upload") as pool:
+        # Entries are either finished status dicts or futures, kept in input order.
+        results = []
+        for org, matched_org, username, password in targets:
+            if not matched_org:
+                results.append(create_upload_status(org, None, False))
+                continue
+
+            ip = matched_org["ip"]
+            logging.info(f"Found IP {ip} for organization {org}. Proceeding with login...")
+            # Each file may also have --kv-parallel batch_save requests open at once.
+            pool_size = max(1, args.per_host) * (max(1, args.kv_parallel) if kvstore is not None else 1)
+            if metrics:
+                metrics.name_host(ip, org)
+            client = get_client(ip, matched_org["port"], username, password, pool_size=pool_size, metrics=metrics)
+
+            for csv_file in normalize_failed:
+                results.append(create_upload_status(org, csv_file, False))
+            for csv_file in csv_files:
+                results.append(pool.submit(ip, process_file, client, org, csv_file, matched_org["app"], definition,
+                                           sync, staging_settings(args, matched_org), kvstore))
+
+        # Collect in submission order so the summary reads the same as a sequential run.
+        upload_status = [r if isinstance(r, dict) else r.result() for r in results]
+
+    if metrics:
+        metrics.finish(args.metrics_json, args.metrics_prom)
+    if normalize_tmp:
+        normalize_tmp.cleanup()
+
+    # Output all upload statuses
+    for status in upload_status:
+        logging.info(f"{status}")
 
-        upload_status.append(create_upload_status(org, csv_file, upload_success, definition_success))
 
-# Output all upload statuses
-for status in upload_status:
-    logging.info(f"{status}")
+if __name__ == "__main__":
+    main()
@@ -1,75 +1,158 @@
+import argparse
+import csv
 import json
-import requests
 import logging
 import getpass
 import pathlib
 import sys
-from requests.auth import HTTPBasicAuth
-from requests.packages.urllib3.exceptions import InsecureRequestWarning
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
 
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+from splunk_inventory import add_inventory_arguments, fleet_targets
+from splunk_metrics import add_metrics_arguments, metrics_from_args
+from splunk_rest_client import get_client
 
-requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-
-if len(sys.argv) != 2:
-    logging.critical("[!] Usage: python create_splunk_macros.py <splunk_app>")
-    sys.exit(1)
-
-
-splunk_app = sys.argv[1]
 
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-credentials_input = input(
-    "Enter credentials in the format 'username,password,organization,' (e.g., user1,password1,org1,user2,password2,org2): "
-)
-credentials_list = credentials_input.strip().split(',')
-
+splunk_management_port = "8089"
 
 ips_and_orgs = [
     {"ip": "xxxxx.splunkcloud.com", "organization": "test_cloud"},
     {"ip": "192.168.100.1", "organization": "test_ip"}
 ]
 
+# macros.conf attributes managed by the declarative mode
+MACRO_FIELDS = ("definition", "args", "description")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Create Splunk macros across multiple Splunk instances.")
+    parser.add_argument("splunk_app", nargs="?",
+                        help="Splunk app the macros live in (default: the organization's app in --inventory)")
+    parser.add_argument("--macros-file", type=pathlib.Path,
+                        help="declarative mode: JSON list or CSV of macros (name, definition, args, description, "
+                             "sharing); only differences from each org's current macros are applied")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="declarative mode: show the changes for each organization without applying them")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="declarative mode: number of organizations synced in parallel (default: 8)")
+    add_inventory_arguments(parser)
+    add_metrics_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def load_macros(macros_file):
+    """Reads the desired macros from a JSON list or a CSV file with a header row."""
+    with macros_file.open(encoding="utf-8", newline="") as f:
+        if macros_file.suffix.lower() == ".csv":
+            rows = list(csv.DictReader(f))
+        else:
+            rows = json.load(f)
+    macros = {}
+    for row in rows:
+        if isinstance(row.get("args"), list):
+            row["args"] = ",".join(row["args"])
+        macro = {field: str(row.get(field) or "") for field in MACRO_FIELDS}
+        macro["sharing"] = row.get("sharing") or "global"
+        macros[row["name"]] = macro
+    return macros
+
+
+def list_macros(client, splunk_app):
+    """Fetches every macro defined in splunk_app with a single request."""
+    response = client.get(
+        f"/servicesNS/-/{splunk_app}/configs/conf-macros",
+        params={"output_mode": "json", "count": 0},
+    )
+    response.raise_for_status()
+    macros = {}
+    for entry in response.json().get("entry", []):
+        acl = entry.get("acl", {})
+        if acl.get("app") != splunk_app:
+            continue
+        content = entry.get("content", {})
+        macro = {field: str(content.get(field) or "") for field in MACRO_FIELDS}
+        macro["sharing"] = acl.get("sharing")
+        macros[entry["name"]] = macro
+    return macros
+
+
+def diff_macros(desired, current):
+    """Returns [(name, action, changed_fields, acl_changed)] for macros that need work."""
+    changes = []
+    for name, macro in desired.items():
+        existing = current.get(name)
+        if existing is None:
+            changes.append((name, "create", {f: macro[f] for f in MACRO_FIELDS if macro[f]}, True))
+            continue
+        changed = {f: macro[f] for f in MACRO_FIELDS if macro[f] != existing[f]}
+        acl_changed = macro["sharing"] != existing["sharing"]
+        if changed or acl_changed:
+            changes.append((name, "update" if changed else "acl", changed, acl_changed))
+    return changes
 
-macro_name = input("Enter the macro name to create: ").strip()
-macro_definition = input("Enter the macro definition (e.g., 'index=* sourcetype=*'): ").strip()
-macro_description = input("Enter a description for the macro (optional): ").strip()
-
-
-upload_status = []
-
-
-for i in range(0, len(credentials_list), 3):
-    username, password, org = credentials_list[i:i + 3]
-    matched_org = next((entry for entry in ips_and_orgs if entry["organization"] == org), None)
 
-    if not matched_org:
-        logging.error(f"No matching organization found for: {org}")
-        upload_status.append({"Organization": org, "Macro_Name": macro_name, "Status": "Failed - Org not found"})
-        continue
+def sync_org(client, org, splunk_app, desired, dry_run=False):
+    status = []
+    try:
+        current = list_macros(client, splunk_app)
+    except Exception as e:
+        logging.error(f"Could not list macros for organization '{org}': {e}")
+        return [{"Organization": org, "Macro_Name": name, "Status": "Error"} for name in desired]
+
+    changes = diff_macros(desired, current)
+    logging.info(f"{org}: {len(changes)} of {len(desired)} macros need changes")
+    changed_names = {name for name, _, _, _ in changes}
+    status.extend({"Organization": org, "Macro_Name": name, "Status": "Unchanged"}
+                  for name in desired if name not in changed_names)
+
+    url_macros = f"/servicesNS/nobody/{splunk_app}/configs/conf-macros"
+    for name, action, fields, acl_changed in changes:
+        if dry_run:
+            logging.info(f"[Dry-run] {org}: {action} macro '{name}' {sorted(fields)}{' + ACL' if acl_changed else ''}")
+            status.append({"Organization": org, "Macro_Name": name, "Status": f"Would {action}"})
+            continue
+        url_macro = f"{url_macros}/{urllib.parse.quote(name, safe='')}"
+        try:
+            if action == "create":
+                response = client.post(url_macros, data=dict(fields, name=name))
+            elif action == "update":
+                response = client.post(url_macro, data=fields)
+            else:
+                response = None
+            if response is not None and response.status_code not in [200, 201]:
+                logging.error(f"Failed to {action} macro '{name}' for {org}. Response: {response.text}")
+                status.append({"Organization": org, "Macro_Name": name, "Status": "Failed"})
+                continue
+            if acl_changed:
+                data_modify_perms = {"sharing": desired[name]["sharing"], "owner": "nobody"}
+                response_modify = client.post(f"{url_macro}/acl", data=data_modify_perms)
+                if response_modify.status_code not in [200, 201]:
+                    logging.error(f"Failed to update permissions for '{name}' for organization '{org}'. Response: {response_modify.text}")
+                    status.append({"Organization": org, "Macro_Name": name, "Status": "Failed - ACL"})
+                    continue
+            logging.info(f"{org}: {action} macro '{name}' done")
+            status.append({"Organization": org, "Macro_Name": name, "Status": {
+                "create": "Created", "update": "Updated", "acl": "ACL Updated"}[action]})
+        except Exception as e:
+            logging.error(f"Error syncing macro '{name}' for organization '{org}': {e}")
+            status.append({"Organization": org, "Macro_Name": name, "Status": "Error"})
+    return status
 
-    ip = matched_org["ip"]
-    logging.info(f"Processing Splunk instance for organization: {org} at {ip}")
 
-    
-    url_create_macro = f"https://{ip}:8089/servicesNS/nobody/{splunk_app}/configs/conf-macros"
+def create_macro(client, org, splunk_app, macro_name, macro_definition, macro_description, upload_status):
+    url_create_macro = f"/servicesNS/nobody/{splunk_app}/configs/conf-macros"
 
-    
     data = {
         "name": macro_name,
         "definition": macro_definition,
         "description": macro_description,
     }
 
-    
     try:
-        response = requests.post(
-            url_create_macro,
-            auth=HTTPBasicAuth(username, password),
-            verify=False,
-            data=data
-        )
+        response = client.post(url_create_macro, data=data)
         definition_success = response.status_code in [200, 201]
         if definition_success:
             logging.info(f"Successfully created macro '{macro_name}' for organization '{org}'.")
@@ -77,24 +160,18 @@ for i in range(0, len(credentials_list), 3):
         else:
             logging.error(f"Failed to create macro '{macro_name}' for {org}. Response: {response.text}")
             upload_status.append({"Organization": org, "Macro_Name": macro_name, "Status": "Failed"})
-            continue
+            return
     except Exception as e:
         logging.error(f"Error creating macro '{macro_name}' for organization '{org}': {e}")
         upload_status.append({"Organization": org, "Macro_Name": macro_name, "Status": "Error"})
-        continue
+        return
 
-    
     if definition_success:
-        url_modify_perms = f"https://{ip}:8089/servicesNS/nobody/{splunk_app}/configs/conf-macros/{macro_name}/acl"
+        url_modify_perms = f"/servicesNS/nobody/{splunk_app}/configs/conf-macros/{macro_name}/acl"
         data_modify_perms = {"sharing": "global", "owner": "nobody"}
 
         try:
-            response_modify = requests.post(
-                url_modify_perms,
-                auth=HTTPBasicAuth(username, password),
-                verify=False,
-                data=data_modify_perms
-            )
+            response_modify = client.post(url_modify_perms, data=data_modify_perms)
             if response_modify.status_code in [200, 201]:
                 logging.info(f"Permissions for '{macro_name}' set to global for organization '{org}'.")
             else:
@@ -103,5 +180,53 @@ for i in range(0, len(credentials_list), 3):
             logging.error(f"Error updating permissions for '{macro_name}' for organization '{org}': {e}")
 
 
-for status in upload_status:
-    logging.info(status)
+def main():
+    args = parse_args()
+    splunk_app = args.splunk_app
+
+    # Credentials from the environment / credentials file, or prompted for
+    targets = fleet_targets(args, ips_and_orgs, splunk_management_port, splunk_app)
+
+    desired = load_macros(args.macros_file) if args.macros_file else None
+    if desired is None:
+        macro_name = input("Enter the macro name to create: ").strip()
+        macro_definition = input("Enter the macro definition (e.g., 'index=* sourcetype=*'): ").strip()
+        macro_description = input("Enter a description for the macro (optional): ").strip()
+
+    metrics = metrics_from_args(args, "create_macros")
+    upload_status = []
+    orgs = {}
+
+    for org, matched_org, username, password in targets:
+        if not matched_org:
+            upload_status.append({"Organization": org, "Macro_Name": "*" if desired else macro_name,
+                                  "Status": "Failed - Org not found"})
+            continue
+
+        ip = matched_org["ip"]
+        logging.info(f"Processing Splunk instance for organization: {org} at {ip}")
+        if metrics:
+            metrics.name_host(ip, org)
+        client = get_client(ip, matched_org["port"], username, password, metrics=metrics)
+
+        if desired is None:
+            create_macro(client, org, matched_org["app"], macro_name, macro_definition, macro_description, upload_status)
+        else:
+            orgs[org] = (client, matched_org["app"])
+
+    if orgs:
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            futures = [pool.submit(sync_org, client, org, org_app, desired, args.dry_run)
+                       for org, (client, org_app) in orgs.items()]
+            for future in futures:
+                upload_status.extend(future.result())
+
+    if metrics:
+        metrics.finish(args.metrics_json, args.metrics_prom)
+
+    for status in upload_status:
+        logging.info(status)
+
+
+if __name__ == "__main__":
+    main()
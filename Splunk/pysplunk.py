@@ -1,9 +1,183 @@
 import splunklib.client as client
+import splunklib.binding as binding
+import argparse
+import getpass
+import http.client
+import io
 import json
+import math
+import os
+import pathlib
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib import parse
+from splunk_inventory import add_inventory_arguments, fleet_targets
+
+# splunkd's default session timeout is an hour; log in again a little before that.
+SESSION_TTL = 50 * 60
+
+_services = {}
+_handlers = {}
+_services_lock = threading.Lock()
+
+
+class _PooledReader(binding.ResponseReader):
+    """Response body that hands its connection back to the pool once it has been read to the end."""
+
+    def __init__(self, response, release):
+        super().__init__(response)
+        self._release = release
+
+    def _done(self, reusable):
+        if self._release:
+            self._release(reusable)
+            self._release = None
+
+    def read(self, size=None):
+        data = super().read(size)
+        if self._response.isclosed():
+            self._done(True)
+        return data
+
+    def close(self):
+        # A body closed before its end leaves unread bytes on the socket, so that connection can't be reused.
+        self._done(self._response.isclosed())
+        self._response.close()
+
+
+class KeepAliveHandler:
+    """splunklib HTTP handler that keeps connections open between requests.
+
+    splunklib's default handler sends Connection: Close and opens a new TCP and
+    TLS connection for every request. This one keeps up to pool_size idle
+    connections per (scheme, host, port) and is safe to share between threads.
+    timeout is per socket operation and, as with splunklib's handler, off by
+    default: jobs.oneshot and a sparse jobs.export can stay silent for minutes.
+    """
+
+    def __init__(self, timeout=None, verify=False, pool_size=8):
+        self.timeout = timeout
+        self.verify = verify
+        self.pool_size = pool_size
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _connect(self, scheme, host, port):
+        if scheme == "http":
+            return http.client.HTTPConnection(host, port, timeout=self.timeout)
+        context = ssl.create_default_context() if self.verify else ssl._create_unverified_context()
+        return http.client.HTTPSConnection(host, port, timeout=self.timeout, context=context)
+
+    def _checkout(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self._connect(*key), False
+
+    def _checkin(self, key, connection, reusable):
+        if reusable:
+            with self._lock:
+                idle = self._idle.setdefault(key, [])
+                if len(idle) < self.pool_size:
+                    idle.append(connection)
+                    return
+        connection.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def __call__(self, url, message, **kwargs):
+        parsed = parse.urlsplit(url)
+        key = (parsed.scheme, parsed.hostname, parsed.port)
+        path = parsed.path + ("?" + parsed.query if parsed.query else "")
+        body = message.get("body", "")
+        head = {
+            "Content-Length": str(len(body)),
+            "Host": parsed.hostname,
+            "User-Agent": "splunk-sdk-python/{}".format(binding.__version__),
+            "Accept": "*/*",
+            "Connection": "Keep-Alive",
+        }
+        head.update(message["headers"])
+        while True:
+            connection, reused = self._checkout(key)
+            try:
+                connection.request(message.get("method", "GET"), path, body, head)
+                response = connection.getresponse()
+                break
+            except (http.client.RemoteDisconnected, http.client.CannotSendRequest, ConnectionResetError, BrokenPipeError):
+                # splunkd closed an idle connection; the request never got there, so send it on a new one.
+                connection.close()
+                if not reused:
+                    raise
+            except Exception:
+                connection.close()
+                raise
+
+        def release(reusable):
+            self._checkin(key, connection, reusable and not response.will_close)
+
+        return {
+            "status": response.status,
+            "reason": response.reason,
+            "headers": response.getheaders(),
+            "body": _PooledReader(response, release),
+        }
+
+
+def get_service(username, password, host, port="8089", owner="admin", app="search", sharing="user"):
+    """Returns a logged-in Service for (host, port, username, owner, app, sharing), reusing the one from an earlier call.
+
+    Services to the same host share a KeepAliveHandler. The session is renewed once it
+    is SESSION_TTL old, and autologin renews it sooner if splunkd expires it first.
+    """
+    key = (host, str(port), username, owner, app, sharing)
+    with _services_lock:
+        service, expires = _services.get(key, (None, 0))
+        if service is not None and service.password == password:
+            if time.monotonic() < expires:
+                return service
+        else:
+            handler = _handlers.setdefault((host, str(port)), KeepAliveHandler())
+            service = client.Service(handler=handler, username=username, password=password, host=host, port=port,
+                                     owner=owner, app=app, sharing=sharing, autologin=True)
+        service.login()
+        _services[key] = (service, time.monotonic() + SESSION_TTL)
+        return service
+
+
+def load_collection(splunk_service, path, page_size=500, workers=8, **params):
+    """Returns every entry of a REST collection such as saved/searches.
+
+    The first page gives paging.total; the remaining pages are fetched with
+    count/offset on a thread pool and put back in order. Extra params (f, search, ...)
+    are passed on each page request.
+    """
+    def page(offset):
+        response = splunk_service.get(path, count=page_size, offset=offset, output_mode="json", **params)
+        return json.loads(response.body.read())
+
+    first = page(0)
+    entries = first.get("entry", [])
+    offsets = range(len(entries), int(first.get("paging", {}).get("total", 0)), page_size)
+    if entries and offsets:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(offsets)))) as pool:
+            for body in pool.map(page, offsets):
+                entries.extend(body.get("entry", []))
+    return entries
+
 
 def connect_to_splunk(username,password,host='10.0.1.12',port='8089',owner='admin',app='search',sharing='user'):
+    service = None
     try:
-        service = client.connect(username=username,password=password,host=host,port=port,owner=owner,app=app,sharing=sharing)
+        service = get_service(username,password,host=host,port=port,owner=owner,app=app,sharing=sharing)
         if service:
             print("Splunk service created successfully")
             print("-----------------------------------")
@@ -58,6 +232,462 @@ def delete_savedsearch(splunk_service,savedsearch_name):
         print(e)
     print("{} deleted correctly".format(savedsearch_name))
 
+def load_savedsearch_definitions(directory):
+    """Loads desired saved/correlation searches from *.json files, each holding one payload dict or a list of them.
+
+    Every definition needs "name" and "search"; all other keys are savedsearches.conf
+    properties, exactly like the payload_ss / payload_alert dicts in main().
+    """
+    definitions = {}
+    for path in sorted(pathlib.Path(directory).glob("*.json")):
+        with path.open(encoding="utf-8") as f:
+            data = json.load(f)
+        for definition in (data if isinstance(data, list) else [data]):
+            definition = dict(definition)
+            definitions[definition.pop("name")] = definition
+    return definitions
+
+
+def _normalize(value):
+    # REST JSON mixes true/false, ints and "1"/"0" strings for the same settings.
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if value is None:
+        return ""
+    value = str(value)
+    if value.lower() in ("true", "false"):
+        return "1" if value.lower() == "true" else "0"
+    return value
+
+
+def fetch_savedsearches(splunk_service, fields):
+    """Returns {name: {field: value}} for every saved search in the service's app, limited to the given fields."""
+    entries = load_collection(splunk_service, "saved/searches", f=sorted(fields))
+    # Searches shared globally from other apps (e.g. ES correlation searches) are listed too, but aren't ours to change.
+    return {entry["name"]: entry["content"] for entry in entries
+            if entry.get("acl", {}).get("app") == splunk_service.namespace.app}
+
+
+def diff_savedsearches(desired, existing):
+    """Returns [(name, action, changed_properties)] where action is 'create' or 'update'."""
+    changes = []
+    for name, definition in desired.items():
+        current = existing.get(name)
+        if current is None:
+            changes.append((name, "create", definition))
+            continue
+        changed = {k: v for k, v in definition.items() if _normalize(v) != _normalize(current.get(k))}
+        if changed:
+            changes.append((name, "update", changed))
+    return changes
+
+
+def apply_savedsearch_change(splunk_service, name, action, properties, path=None):
+    """Creates or updates one saved search; path is the entity's links.edit when it isn't in the service's namespace."""
+    try:
+        if action == "create":
+            properties = dict(properties)
+            splunk_service.saved_searches.create(name, properties.pop("search"), **properties)
+        else:
+            # POST only the changed properties straight to the entity; no read-back or refresh.
+            path = binding.UrlEncoded(path or "saved/searches/" + parse.quote(name, safe=""), skip_encode=True)
+            # Read the (small) reply so the keep-alive connection goes back to the pool.
+            splunk_service.post(path, **properties).body.read()
+        return "Created" if action == "create" else "Updated"
+    except Exception as e:
+        print("{} {} failed: {}".format(name, action, e))
+        return "Failed"
+
+
+def sync_savedsearches(services, desired, workers=8, dry_run=False):
+    """Brings each service's saved searches in line with desired, touching only what differs.
+
+    services maps an instance label to a connected splunklib Service.
+    """
+    fields = {"search"}
+    for definition in desired.values():
+        fields.update(definition)
+
+    def plan(label):
+        try:
+            return label, diff_savedsearches(desired, fetch_savedsearches(services[label], fields))
+        except Exception as e:
+            print("{}: listing saved searches failed: {}".format(label, e))
+            return label, None
+
+    status = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        plans = list(pool.map(plan, services))
+        futures = []
+        for label, changes in plans:
+            if changes is None:
+                # One unreachable instance should not stop the others from being synced.
+                status.append({"Instance": label, "Name": "N/A", "Status": "Failed"})
+                continue
+            print("{}: {} of {} saved searches need changes".format(label, len(changes), len(desired)))
+            for name, action, properties in changes:
+                if dry_run:
+                    print("[dry-run] {}: {} {} {}".format(label, action, name, sorted(properties)))
+                    continue
+                futures.append((label, name, pool.submit(apply_savedsearch_change, services[label], name, action, properties)))
+        for label, name, future in futures:
+            status.append({"Instance": label, "Name": name, "Status": future.result()})
+    print("-----------------------------------")
+    return status
+
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def _cron_field(field, low, high):
+    """Expands one cron field (*, */n, a-b/n, a,b, n) into the list of values it matches."""
+    values = set()
+    for part in field.split(","):
+        rng, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if rng == "*":
+            start, end = low, high
+        elif "-" in rng:
+            start, end = (int(v) for v in rng.split("-"))
+        else:
+            start = int(rng)
+            end = high if step > 1 else start
+        values.update(range(start, end + 1, step))
+    return sorted(values)
+
+
+def expand_cron(cron_schedule):
+    """Returns the minutes of the day (0-1439) at which a cron schedule fires.
+
+    Day-of-month, month and day-of-week are ignored: every schedule is
+    treated as running on the day being analysed.
+    """
+    minute, hour = cron_schedule.split()[:2]
+    return [h * 60 + m for h in _cron_field(hour, 0, 23) for m in _cron_field(minute, 0, 59)]
+
+
+def cron_period(cron_schedule):
+    """Returns (period_minutes, first_offset) for schedules that repeat at a fixed interval within each hour, else None."""
+    fields = cron_schedule.split()
+    if len(fields) != 5 or fields[1] != "*":
+        return None
+    minutes = _cron_field(fields[0], 0, 59)
+    gaps = {b - a for a, b in zip(minutes, minutes[1:] + [minutes[0] + 60])}
+    if len(gaps) != 1:
+        return None
+    return gaps.pop(), minutes[0]
+
+
+def fetch_scheduled_searches(splunk_service):
+    """Returns {label: content} for every enabled scheduled search on the instance, in any app and of any owner.
+
+    Scheduler contention is instance-wide, so the listing goes through servicesNS/-/-.
+    label is "<app>/<name>", prefixed with "<owner>:" when another owner's search already
+    took it; content also carries the search's "app", "name" and "edit" path.
+    """
+    fields = ["cron_schedule", "schedule_window", "is_scheduled", "disabled"]
+    entries = load_collection(splunk_service, "saved/searches", owner="-", app="-", f=fields, search="is_scheduled=1")
+    searches = {}
+    for entry in entries:
+        content = entry["content"]
+        if (_normalize(content.get("is_scheduled")) != "1" or _normalize(content.get("disabled")) == "1"
+                or not content.get("cron_schedule")):
+            continue
+        acl = entry.get("acl", {})
+        label = "{}/{}".format(acl.get("app"), entry["name"])
+        if label in searches:
+            label = "{}:{}".format(acl.get("owner"), label)
+        searches[label] = dict(content, app=acl.get("app"), name=entry["name"], edit=entry["links"]["edit"])
+    return searches
+
+
+def fetch_runtime_costs(splunk_service, earliest="-24h"):
+    """Returns {"<app>/<saved search name>": average run time in seconds} from the scheduler's dispatch history."""
+    query = ("search index=_internal sourcetype=scheduler status=success earliest={} "
+             "| stats avg(run_time) as avg_run_time by app, savedsearch_name".format(earliest))
+    response = splunk_service.jobs.oneshot(query, output_mode="json", count=0)
+    results = json.loads(response.read()).get("results", [])
+    return {"{}/{}".format(r["app"], r["savedsearch_name"]): float(r["avg_run_time"]) for r in results}
+
+
+def _occupied_minutes(start, runtime):
+    # A search occupies a scheduler slot from its start minute for as many minutes as it runs.
+    return [(start + i) % MINUTES_PER_DAY for i in range(max(1, int(math.ceil(runtime / 60.0))))]
+
+
+def scheduler_load(schedules, costs, default_runtime=30.0):
+    """Returns a per-minute list of how many of the given searches are running."""
+    load = [0] * MINUTES_PER_DAY
+    for name, cron_schedule in schedules.items():
+        for start in expand_cron(cron_schedule):
+            for minute in _occupied_minutes(start, costs.get(name, default_runtime)):
+                load[minute] += 1
+    return load
+
+
+def _with_offset(cron_schedule, period, offset):
+    fields = cron_schedule.split()
+    if period >= 60:
+        fields[0] = str(offset)
+    elif offset == 0:
+        fields[0] = "*/{}".format(period)
+    else:
+        fields[0] = "{}-59/{}".format(offset, period)
+    return " ".join(fields)
+
+
+def propose_cron_offsets(searches, costs, default_runtime=30.0):
+    """Greedily re-phases fixed-interval searches so concurrency is as flat as possible.
+
+    Each search keeps its period; only the minute it starts within that period
+    moves. Heaviest searches are placed first. Returns {name: new_cron_schedule}
+    for the searches whose schedule changes.
+    """
+    schedules = {name: content["cron_schedule"] for name, content in searches.items()}
+    fixed = {}
+    movable = []
+    for name, cron_schedule in schedules.items():
+        period = cron_period(cron_schedule)
+        if period is None or period[0] <= 1:
+            fixed[name] = cron_schedule
+        else:
+            movable.append((name, period[0]))
+    load = scheduler_load(fixed, costs, default_runtime)
+    movable.sort(key=lambda item: costs.get(item[0], default_runtime), reverse=True)
+
+    proposals = {}
+    for name, period in movable:
+        runtime = costs.get(name, default_runtime)
+        best = None
+        for offset in range(min(period, 60)):
+            candidate = _with_offset(schedules[name], period, offset)
+            minutes = [m for start in expand_cron(candidate) for m in _occupied_minutes(start, runtime)]
+            score = (max(load[m] for m in minutes), sum(load[m] for m in minutes))
+            if best is None or score < best[0]:
+                best = (score, candidate, minutes)
+        for minute in best[2]:
+            load[minute] += 1
+        if best[1] != schedules[name]:
+            proposals[name] = best[1]
+    return proposals
+
+
+def analyze_schedule(splunk_service, earliest="-24h", mode="cron", apply=False):
+    """Reports scheduler concurrency for one instance and proposes (optionally applies) a de-skewed schedule."""
+    searches = fetch_scheduled_searches(splunk_service)
+    history = fetch_runtime_costs(splunk_service, earliest)
+    costs = {}
+    for label, content in searches.items():
+        key = "{}/{}".format(content["app"], content["name"])
+        if key in history:
+            costs[label] = history[key]
+    schedules = {name: content["cron_schedule"] for name, content in searches.items()}
+    before = scheduler_load(schedules, costs)
+    proposals = propose_cron_offsets(searches, costs)
+    after = scheduler_load(dict(schedules, **proposals), costs)
+
+    busiest = sorted(range(MINUTES_PER_DAY), key=lambda m: before[m], reverse=True)[:5]
+    print("{} scheduled searches, {} with dispatch history".format(len(searches), len(costs)))
+    print("Peak concurrency: {} -> {} after staggering".format(max(before or [0]), max(after or [0])))
+    print("Busiest minutes: {}".format(", ".join("{:02d}:{:02d} ({})".format(m // 60, m % 60, before[m]) for m in busiest)))
+
+    changes = {}
+    for name, cron_schedule in sorted(proposals.items()):
+        if mode == "window":
+            # Let the scheduler pick the start time within half of the search's period instead.
+            period = cron_period(schedules[name])[0]
+            changes[name] = {"schedule_window": str(max(1, period // 2))}
+        else:
+            changes[name] = {"cron_schedule": cron_schedule}
+        print("{}: {} -> {}".format(name, schedules[name], changes[name]))
+    print("-----------------------------------")
+
+    if apply:
+        for name, properties in changes.items():
+            # Through the search's own namespace; the service's app may not be the one it lives in.
+            apply_savedsearch_change(splunk_service, name, "update", properties, searches[name]["edit"])
+    return {"before": before, "after": after, "changes": changes}
+
+
+def _export_query(query=None, savedsearch=None):
+    if savedsearch:
+        return '| savedsearch "{}"'.format(savedsearch.replace('"', '\\"'))
+    query = query.strip()
+    # search/jobs/export needs a leading generating command, like the search bar adds implicitly.
+    return query if query.startswith(("search ", "|")) else "search " + query
+
+
+def export_search(splunk_service, query, write, earliest="-24h", latest="now", max_results=0, timeout=0):
+    """Streams the results of query from search/jobs/export into write(), one result dict at a time.
+
+    Nothing is buffered beyond the row being parsed. max_results stops reading
+    (and closes the stream) after that many rows; timeout bounds both the
+    search's own max_time and the wall-clock time spent reading. Returns
+    (rows, status) where status is "complete", "truncated" or "timed out".
+    """
+    params = {"earliest_time": earliest, "latest_time": latest, "output_mode": "json"}
+    if timeout:
+        params["max_time"] = timeout
+    deadline = time.monotonic() + timeout if timeout else None
+    stream = splunk_service.jobs.export(query, **params)
+    rows = 0
+    status = "complete"
+    try:
+        # Not splunklib.results.JSONResultsReader: it calls readlines(), so the whole export is held in memory
+        # before the first row and max_results / the deadline could not stop the download early.
+        for line in io.BufferedReader(stream):
+            line = line.strip()
+            if not line:
+                continue
+            event = json.loads(line)
+            for message in event.get("messages") or []:
+                print("{}: {}".format(message.get("type", "Unknown Message Type"), message.get("text")))
+            # Transforming searches stream previews before the final result set.
+            if event.get("preview") or "result" not in event:
+                continue
+            write(event["result"])
+            rows += 1
+            if max_results and rows >= max_results:
+                status = "truncated"
+                break
+            if deadline and time.monotonic() > deadline:
+                status = "timed out"
+                break
+    finally:
+        stream.close()
+    return rows, status
+
+
+def export_fleet(services, query, output, merge=False, earliest="-24h", latest="now", max_results=0,
+                 timeout=0, workers=8):
+    """Runs query on every service at once, writing NDJSON to output/<instance>.ndjson, or to one merged output file.
+
+    Merged rows carry an "instance" field naming the service they came from.
+    """
+    output = pathlib.Path(output)
+    lock = threading.Lock()
+    merged = None
+    if merge:
+        output.parent.mkdir(parents=True, exist_ok=True)
+        merged = output.open("w", encoding="utf-8")
+    else:
+        output.mkdir(parents=True, exist_ok=True)
+
+    def run(label):
+        started = time.monotonic()
+        try:
+            if merged:
+                def write(result):
+                    line = json.dumps(dict(result, instance=label)) + "\n"
+                    with lock:
+                        merged.write(line)
+                rows, status = export_search(services[label], query, write, earliest, latest, max_results, timeout)
+            else:
+                with (output / "{}.ndjson".format(label)).open("w", encoding="utf-8") as f:
+                    rows, status = export_search(services[label], query, lambda result: f.write(json.dumps(result) + "\n"),
+                                                 earliest, latest, max_results, timeout)
+        except Exception as e:
+            print("{}: export failed: {}".format(label, e))
+            rows, status = 0, "failed"
+        elapsed = time.monotonic() - started
+        print("{}: {} rows in {:.1f}s ({})".format(label, rows, elapsed, status))
+        return {"Instance": label, "Rows": rows, "Seconds": round(elapsed, 1), "Status": status}
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            status = list(pool.map(run, services))
+    finally:
+        if merged:
+            merged.close()
+    print("-----------------------------------")
+    return status
+
+
+def parse_args(argv=None):
+    connection = argparse.ArgumentParser(add_help=False)
+    connection.add_argument("--host", action="append", help="Splunk management host (repeatable); or use --inventory")
+    connection.add_argument("--port", default="8089")
+    connection.add_argument("--username", default="admin")
+    connection.add_argument("--password", help="with --host: taken from $SPLUNK_PASSWORD or prompted for when omitted")
+    connection.add_argument("--owner", default="nobody")
+    connection.add_argument("--app", help="app namespace (default: the organization's app in --inventory, else search)")
+    add_inventory_arguments(connection)
+
+    parser = argparse.ArgumentParser(description="Manage Splunk saved searches.")
+    subparsers = parser.add_subparsers(dest="command")
+    sync = subparsers.add_parser("sync", parents=[connection],
+                                 help="sync a directory of saved-search definitions to one or more instances")
+    sync.add_argument("directory", help="directory of *.json saved-search / correlation-search definitions")
+    sync.add_argument("--workers", type=int, default=8, help="parallel requests across searches and instances (default: 8)")
+    sync.add_argument("--dry-run", action="store_true", help="show the changes without applying them")
+
+    schedule = subparsers.add_parser("schedule", parents=[connection],
+                                     help="report scheduler concurrency and propose staggered schedules")
+    schedule.add_argument("--earliest", default="-24h", help="dispatch history window used for run times (default: -24h)")
+    schedule.add_argument("--mode", choices=["cron", "window"], default="cron",
+                          help="cron shifts each search's start offset; window sets schedule_window instead (default: cron)")
+    schedule.add_argument("--apply", action="store_true", help="apply the proposed changes")
+
+    export = subparsers.add_parser("export", parents=[connection],
+                                   help="run a search on every instance at once and stream the results to NDJSON")
+    target = export.add_mutually_exclusive_group(required=True)
+    target.add_argument("--query", help="SPL to run (a leading 'search' is added when missing)")
+    target.add_argument("--savedsearch", help="name of a saved search to dispatch instead of --query")
+    export.add_argument("--output", required=True,
+                        help="directory for one <host>.ndjson per instance, or the file to write with --merge")
+    export.add_argument("--merge", action="store_true", help="write every instance's rows to the single --output file")
+    export.add_argument("--earliest", default="-24h", help="earliest time for each instance (default: -24h)")
+    export.add_argument("--latest", default="now", help="latest time for each instance (default: now)")
+    export.add_argument("--max-results", type=int, default=0, help="stop after this many rows per instance (default: no cap)")
+    export.add_argument("--timeout", type=int, default=0,
+                        help="seconds each instance may spend searching and streaming (default: no limit)")
+    export.add_argument("--workers", type=int, default=8, help="instances exported in parallel (default: 8)")
+    return parser.parse_args(argv)
+
+
+def connect_services(args):
+    """Connects to every --host, or to the organizations from --inventory; returns {label: service}."""
+    services = {}
+    if not args.host:
+        if not args.inventory:
+            raise SystemExit("either --host or --inventory is required")
+        for org, entry, username, password in fleet_targets(args, [], args.port, args.app, "search"):
+            if entry:
+                service = connect_to_splunk(username, password, host=entry["ip"], port=entry["port"],
+                                            owner=args.owner, app=entry["app"], sharing="app")
+                if service:
+                    services[org] = service
+        return services
+    password = args.password or os.environ.get("SPLUNK_PASSWORD") or getpass.getpass("Splunk password: ")
+    for host in args.host:
+        service = connect_to_splunk(args.username, password, host=host, port=args.port, owner=args.owner,
+                                    app=args.app or "search", sharing="app")
+        if service:
+            services[host] = service
+    return services
+
+
+def run_sync(args):
+    desired = load_savedsearch_definitions(args.directory)
+    services = connect_services(args)
+    for status in sync_savedsearches(services, desired, args.workers, args.dry_run):
+        print(status)
+
+
+def run_schedule(args):
+    for host, service in connect_services(args).items():
+        print("Instance {}".format(host))
+        analyze_schedule(service, args.earliest, args.mode, args.apply)
+
+
+def run_export(args):
+    query = _export_query(args.query, args.savedsearch)
+    status = export_fleet(connect_services(args), query, args.output, args.merge, args.earliest, args.latest,
+                          args.max_results, args.timeout, args.workers)
+    for entry in status:
+        print(entry)
+
+
 def main():
     try:
         splunk_service = connect_to_splunk(username='admin', password='your_password_here')  # Update with your password
@@ -120,4 +750,12 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.command == "sync":
+        run_sync(args)
+    elif args.command == "schedule":
+        run_schedule(args)
+    elif args.command == "export":
+        run_export(args)
+    else:
+        main()
@@ -0,0 +1,156 @@
+import csv
+import json
+import logging
+import os
+import pathlib
+import re
+import stat
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# Fleet inventory and credentials shared by the Splunk scripts.
+#
+# The inventory is a JSON, YAML or CSV file of organizations. Each one has a
+# host ("ip"), an optional port and an optional default app. It is loaded into a
+# dict keyed by organization, so every lookup is a single dict access.
+# Credentials come from, in order of precedence:
+#   SPLUNK_<ORG>_USERNAME / SPLUNK_<ORG>_PASSWORD  (ORG upper-cased, non-alphanumerics as "_")
+#   the organization's entry in the credentials file
+#   SPLUNK_USERNAME / SPLUNK_PASSWORD
+#   the credentials file's "default" entry
+# When none of these are set, the scripts fall back to the interactive prompt.
+
+CREDENTIALS_FILE_ENV = "SPLUNK_CREDENTIALS_FILE"
+CREDENTIALS_PROMPT = (
+    "Enter credentials in the format 'username,password,organization,' (e.g., user1,password1,org1,user2,password2,org2): "
+)
+
+
+def _read_records(path):
+    """Reads a JSON/YAML list or mapping, or a CSV with a header row, into a list of dicts or a dict."""
+    path = pathlib.Path(path)
+    with path.open(encoding="utf-8", newline="") as f:
+        if path.suffix.lower() == ".csv":
+            return list(csv.DictReader(f))
+        if path.suffix.lower() in (".yaml", ".yml"):
+            if yaml is None:
+                raise RuntimeError(f"{path} needs the PyYAML package (pip install pyyaml)")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def index_inventory(entries, default_port="8089", default_app=None):
+    """Builds {organization: {"organization", "ip", "port", "app", ...}} from a list of entries
+    like the scripts' ips_and_orgs; "org"/"name" and "host" are accepted as aliases."""
+    inventory = {}
+    for entry in entries:
+        org = entry.get("organization") or entry.get("org") or entry.get("name")
+        host = entry.get("ip") or entry.get("host")
+        if not org or not host:
+            raise ValueError(f"Inventory entry needs an organization and a host/ip: {entry}")
+        if org in inventory:
+            raise ValueError(f"Organization '{org}' is listed more than once in the inventory")
+        inventory[org] = dict(entry, organization=org, ip=host,
+                              port=str(entry.get("port") or default_port), app=entry.get("app") or default_app)
+    return inventory
+
+
+def load_inventory(path, default_port="8089", default_app=None):
+    """Loads an inventory file: a list of entries, {"defaults": {...}, "orgs": [...]}, or a mapping of org -> entry."""
+    data = _read_records(path)
+    defaults = {}
+    if isinstance(data, dict):
+        defaults = data.get("defaults", {})
+        orgs = data.get("orgs")
+        if orgs is None:
+            orgs = [dict(entry, organization=org) for org, entry in data.items() if org != "defaults"]
+        elif isinstance(orgs, dict):
+            orgs = [dict(entry, organization=org) for org, entry in orgs.items()]
+        data = orgs
+    return index_inventory(data, defaults.get("port") or default_port, defaults.get("app") or default_app)
+
+
+def _env_name(org):
+    return re.sub(r"[^A-Za-z0-9]", "_", org).upper()
+
+
+def load_credentials_file(path):
+    """Returns {organization or "default": {"username", "password"}} from a JSON/YAML mapping or a CSV
+    with organization,username,password columns (organization "default" or "*" applies to every org)."""
+    path = pathlib.Path(path)
+    if os.name == "posix" and path.stat().st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+        logging.warning(f"Credentials file {path} is readable by other users; consider chmod 600")
+    data = _read_records(path)
+    if isinstance(data, list):
+        data = {row.get("organization") or row.get("org"): row for row in data}
+    data = dict(data.get("orgs", {}), **{k: v for k, v in data.items() if k != "orgs"})
+    if "*" in data:
+        data.setdefault("default", data.pop("*"))
+    return {org: {"username": entry.get("username"), "password": entry.get("password")} for org, entry in data.items()}
+
+
+def resolve_credentials(org, credentials_file=None):
+    """Returns (username, password) for org from the environment and credentials file, or (None, None)."""
+    credentials_file = credentials_file or {}
+    prefix = f"SPLUNK_{_env_name(org)}_"
+    candidates = [
+        (os.environ.get(prefix + "USERNAME"), os.environ.get(prefix + "PASSWORD")),
+        tuple(credentials_file.get(org, {}).get(k) for k in ("username", "password")),
+        (os.environ.get("SPLUNK_USERNAME"), os.environ.get("SPLUNK_PASSWORD")),
+        tuple(credentials_file.get("default", {}).get(k) for k in ("username", "password")),
+    ]
+    username = next((u for u, _ in candidates if u), None)
+    password = next((p for _, p in candidates if p), None)
+    return username, password
+
+
+def add_inventory_arguments(parser):
+    parser.add_argument("--inventory",
+                        help="JSON/YAML/CSV file of organizations with ip, port and app; replaces the built-in ips_and_orgs")
+    parser.add_argument("--credentials",
+                        help=f"JSON/YAML/CSV credentials per organization (or ${CREDENTIALS_FILE_ENV}); with this or "
+                             "SPLUNK_USERNAME/SPLUNK_PASSWORD set, no credentials are prompted for")
+    parser.add_argument("--orgs",
+                        help="comma-separated organizations to run against when credentials are not prompted for "
+                             "(default: every organization in the inventory)")
+
+
+def fleet_targets(args, ips_and_orgs, default_port="8089", app=None, default_app=None):
+    """Returns [(org, entry, username, password)] for the run; entry is None for an organization that is not in
+    the inventory, has no credentials or has no app (already logged), so callers can record it as failed.
+
+    app, when given, overrides each entry's app; default_app fills in for entries without one. Credentials come from the
+    environment/credentials file when available, otherwise from the interactive prompt.
+    """
+    if args.inventory:
+        inventory = load_inventory(args.inventory, default_port, default_app)
+    else:
+        inventory = index_inventory(ips_and_orgs, default_port, default_app)
+
+    credentials_path = args.credentials or os.environ.get(CREDENTIALS_FILE_ENV)
+    credentials_file = load_credentials_file(credentials_path) if credentials_path else None
+    unattended = credentials_file is not None or args.orgs or any(
+        key == "SPLUNK_PASSWORD" or (key.startswith("SPLUNK_") and key.endswith("_PASSWORD")) for key in os.environ)
+
+    def resolve(org, username, password):
+        entry = inventory.get(org)
+        if entry is None:
+            logging.error(f"No matching organization found for: {org}")
+        elif not username or not password:
+            logging.error(f"No credentials found for organization: {org}")
+        elif not (app or entry["app"]):
+            logging.error(f"No Splunk app given for organization {org}; pass <splunk_app> or set its app in the inventory")
+        else:
+            return org, dict(entry, app=app or entry["app"]), username, password
+        return org, None, username, password
+
+    if unattended:
+        orgs = [org.strip() for org in args.orgs.split(",") if org.strip()] if args.orgs else list(inventory)
+        return [resolve(org, *resolve_credentials(org, credentials_file)) for org in orgs]
+
+    credentials_list = input(CREDENTIALS_PROMPT).strip().split(',')
+    return [resolve(credentials_list[i + 2], credentials_list[i], credentials_list[i + 1])
+            for i in range(0, len(credentials_list) - 2, 3)]
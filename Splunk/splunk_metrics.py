@@ -0,0 +1,262 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+# Per-request timing for the REST scripts. SplunkRestClient calls
+# MetricsRecorder.record() once per request (after any retries), and the
+# recorder keeps counts, bytes, retries and a latency histogram for every
+# (organization, method, endpoint). At the end of a run they are written as
+# JSON and/or in the Prometheus text format (e.g. for node_exporter's textfile
+# collector).
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float("inf"))
+
+# REST collections whose next path segment is an object name, longest first
+COLLECTIONS = sorted([
+    "data/lookup_edit/lookup_contents",
+    "data/lookup-table-files",
+    "data/transforms/lookups",
+    "configs/conf-macros",
+    "configs/conf-limits",
+    "storage/collections/config",
+    "storage/collections/data",
+    "saved/searches",
+    "search/jobs",
+    "auth/login",
+], key=len, reverse=True)
+
+
+def endpoint_template(path):
+    """Collapses a request path to its endpoint, e.g. /servicesNS/admin/search/data/transforms/lookups/foo/acl
+    becomes data/transforms/lookups/{name}/acl, so requests for different objects aggregate together."""
+    path = re.sub(r"^https?://[^/]+", "", path).split("?")[0].strip("/")
+    segments = path.split("/")
+    if segments[0] == "servicesNS":
+        segments = segments[3:]
+    elif segments[0] == "services":
+        segments = segments[1:]
+    rest = "/".join(segments)
+    for collection in COLLECTIONS:
+        if rest == collection or rest.startswith(collection + "/"):
+            tail = rest[len(collection) + 1:].split("/") if rest != collection else []
+            return "/".join([collection] + (["{name}"] + tail[1:] if tail else []))
+    return "/".join(segments[:2])
+
+
+class _Series:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.seconds = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(BUCKETS)
+        self.statuses = {}
+        self.durations = []
+
+    def add(self, status, duration, bytes_sent, bytes_received, retries):
+        self.count += 1
+        self.errors += status is None or status >= 400
+        self.retries += retries
+        self.bytes_sent += bytes_sent
+        self.bytes_received += bytes_received
+        self.seconds += duration
+        self.max = max(self.max, duration)
+        self.buckets[next(i for i, bound in enumerate(BUCKETS) if duration <= bound)] += 1
+        key = str(status) if status is not None else "error"
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+        self.durations.append(duration)
+
+    def merge(self, other):
+        self.count += other.count
+        self.errors += other.errors
+        self.retries += other.retries
+        self.bytes_sent += other.bytes_sent
+        self.bytes_received += other.bytes_received
+        self.seconds += other.seconds
+        self.max = max(self.max, other.max)
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        self.durations.extend(other.durations)
+
+    def summary(self):
+        durations = sorted(self.durations)
+
+        def percentile(p):
+            return round(durations[min(len(durations) - 1, int(len(durations) * p))], 4) if durations else 0.0
+
+        return {
+            "requests": self.count,
+            "errors": self.errors,
+            "retries": self.retries,
+            "statuses": self.statuses,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "seconds_total": round(self.seconds, 4),
+            "p50": percentile(0.50),
+            "p90": percentile(0.90),
+            "p99": percentile(0.99),
+            "max": round(self.max, 4),
+            "histogram": {("+Inf" if bound == float("inf") else str(bound)): count
+                          for bound, count in zip(BUCKETS, self.buckets)},
+        }
+
+
+class MetricsRecorder:
+    """Collects per-request metrics from SplunkRestClient; thread safe."""
+
+    def __init__(self, script):
+        self.script = script
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._series = {}
+        self._orgs = {}
+        self._progress = None
+
+    def name_host(self, host, org):
+        """Reports requests to host under the organization name instead of the address."""
+        self._orgs[host] = org
+
+    def record(self, host, method, path, status, duration, bytes_sent=0, bytes_received=0, retries=0):
+        key = (self._orgs.get(host, host), method, endpoint_template(path))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series()
+            series.add(status, duration, bytes_sent, bytes_received, retries)
+
+    def _grouped(self, index):
+        groups = {}
+        for key, series in self._series.items():
+            name = key[index] if index is not None else "all"
+            groups.setdefault(name, _Series()).merge(series)
+        return groups
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "script": self.script,
+                "started": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.started)),
+                "elapsed_seconds": round(time.time() - self.started, 3),
+                "total": self._grouped(None)["all"].summary() if self._series else _Series().summary(),
+                "by_org": {name: s.summary() for name, s in sorted(self._grouped(0).items())},
+                "by_endpoint": {name: s.summary() for name, s in sorted(self._grouped(2).items())},
+                "series": [dict(org=org, method=method, endpoint=endpoint, **series.summary())
+                           for (org, method, endpoint), series in sorted(self._series.items())],
+            }
+
+    def write_json(self, path):
+        _write_atomic(path, json.dumps(self.to_dict(), indent=2))
+
+    def write_prometheus(self, path):
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"])
+
+        def labels(**values):
+            escaped = {k: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for k, v in values.items()}
+            return "{" + ",".join(f'{k}="{v}"' for k, v in escaped.items()) + "}"
+
+        with self._lock:
+            series = sorted(self._series.items())
+            family("splunk_rest_request_duration_seconds", "histogram", "Splunk REST request latency, including retries.")
+            for (org, method, endpoint), s in series:
+                cumulative = 0
+                for bound, count in zip(BUCKETS, s.buckets):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f"splunk_rest_request_duration_seconds_bucket"
+                                 f"{labels(script=self.script, org=org, method=method, endpoint=endpoint, le=le)} {cumulative}")
+                base = labels(script=self.script, org=org, method=method, endpoint=endpoint)
+                lines.append(f"splunk_rest_request_duration_seconds_sum{base} {s.seconds:.6f}")
+                lines.append(f"splunk_rest_request_duration_seconds_count{base} {s.count}")
+            family("splunk_rest_requests_total", "counter", "Splunk REST requests by final status.")
+            for (org, method, endpoint), s in series:
+                for status, count in sorted(s.statuses.items()):
+                    lines.append(f"splunk_rest_requests_total"
+                                 f"{labels(script=self.script, org=org, method=method, endpoint=endpoint, status=status)} {count}")
+            for name, attribute, help_text in (
+                ("splunk_rest_request_retries_total", "retries", "Retried attempts (throttling, connection errors, re-login)."),
+                ("splunk_rest_bytes_sent_total", "bytes_sent", "Request body bytes sent."),
+                ("splunk_rest_bytes_received_total", "bytes_received", "Response body bytes received."),
+            ):
+                family(name, "counter", help_text)
+                for (org, method, endpoint), s in series:
+                    lines.append(f"{name}{labels(script=self.script, org=org, method=method, endpoint=endpoint)} "
+                                 f"{getattr(s, attribute)}")
+        family("splunk_rest_run_seconds", "gauge", "Wall-clock duration of the run.")
+        lines.append(f"splunk_rest_run_seconds{labels(script=self.script)} {time.time() - self.started:.3f}")
+        _write_atomic(path, "\n".join(lines) + "\n")
+
+    def start_progress(self, interval=1.0, stream=sys.stderr):
+        """Redraws a one-line throughput summary on stream every interval seconds until stop_progress()."""
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                stream.write("\r" + self._progress_line())
+                stream.flush()
+            stream.write("\r" + self._progress_line() + "\n")
+            stream.flush()
+
+        thread = threading.Thread(target=run, name="progress", daemon=True)
+        self._progress = (stop, thread)
+        thread.start()
+
+    def stop_progress(self):
+        if self._progress:
+            stop, thread = self._progress
+            stop.set()
+            thread.join()
+            self._progress = None
+
+    def _progress_line(self):
+        with self._lock:
+            series = list(self._series.values())
+        elapsed = max(time.time() - self.started, 1e-9)
+        count = sum(s.count for s in series)
+        errors = sum(s.errors for s in series)
+        retries = sum(s.retries for s in series)
+        sent = sum(s.bytes_sent for s in series) / (1024 * 1024)
+        return (f"{count} requests ({count / elapsed:.1f}/s), {sent:.1f} MB sent ({sent / elapsed:.2f} MB/s), "
+                f"{errors} errors, {retries} retries, {elapsed:.0f}s elapsed ")
+
+    def finish(self, json_path=None, prometheus_path=None):
+        """Stops the progress line and writes whichever outputs were requested."""
+        self.stop_progress()
+        if json_path:
+            self.write_json(json_path)
+        if prometheus_path:
+            self.write_prometheus(prometheus_path)
+
+
+def _write_atomic(path, text):
+    # Scrapers may read the file at any time; never let them see half of it.
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument("--metrics-json", help="write per-org / per-endpoint request timings to this JSON file")
+    parser.add_argument("--metrics-prom", help="write the same metrics in Prometheus text format to this file")
+    parser.add_argument("--progress", action="store_true", help="show a live request throughput line on stderr")
+
+
+def metrics_from_args(args, script):
+    """Returns a MetricsRecorder (with the progress line started if asked for), or None when no metrics were requested."""
+    if not (args.metrics_json or args.metrics_prom or args.progress):
+        return None
+    metrics = MetricsRecorder(script)
+    if args.progress:
+        metrics.start_progress()
+    return metrics
@@ -0,0 +1,189 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.exceptions import InsecureRequestWarning
+
+# Disable warning for insecure requests
+requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+
+# Shared Splunk REST client used by the lookup and macro scripts.
+#
+# One pooled requests.Session per host keeps TLS connections alive between
+# calls, and authenticating once against /services/auth/login means splunkd
+# validates a session key instead of re-checking basic credentials on every
+# request.
+
+DEFAULT_TIMEOUT = (10, 60)  # (connect, read) seconds
+RETRY_STATUS = (429, 503)
+# Methods safe to resend after a read timeout; a POST may already have been applied.
+IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE", "OPTIONS")
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class SplunkRestClient:
+    def __init__(self, host, port, username, password, verify=False, timeout=DEFAULT_TIMEOUT,
+                 retries=5, backoff=0.5, max_backoff=30, pool_size=16, metrics=None):
+        self.host = host
+        self.port = port
+        self.base_url = f"https://{host}:{port}"
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.verify = verify
+        self.session = requests.Session()
+        self.session.verify = verify
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session_key = None
+        self._login_lock = threading.Lock()
+        # Optional splunk_metrics.MetricsRecorder
+        self.metrics = metrics
+
+    def login(self, stale_key=None):
+        with self._login_lock:
+            # Another thread may already have replaced the key that just expired.
+            if self.session_key is not None and self.session_key != stale_key:
+                return self.session_key
+            # Same retries as any other request, so a throttled login backs off too.
+            response = self.request(
+                "POST", "/services/auth/login",
+                data={"username": self.username, "password": self.password, "output_mode": "json"},
+                headers={"Authorization": None},
+                authenticate=False,
+            )
+            if response.status_code != 200:
+                raise requests.HTTPError(
+                    f"Login to {self.host} failed with status {response.status_code}: {response.text}",
+                    response=response,
+                )
+            self.session_key = response.json()["sessionKey"]
+            self.session.headers["Authorization"] = f"Splunk {self.session_key}"
+            logging.info(f"Authenticated to {self.host} as {self.username}")
+            return self.session_key
+
+    def _sleep_before_retry(self, attempt, response=None):
+        delay = min(self.max_backoff, self.backoff * (2 ** attempt))
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, int(retry_after))
+        # Full jitter so a fleet of workers throttled together does not retry together.
+        time.sleep(random.uniform(0, delay))
+
+    def request(self, method, path, authenticate=True, **kwargs):
+        """Sends a request to path (e.g. '/servicesNS/nobody/search/...'), retrying on 429/503 and connection errors.
+
+        Read timeouts are only retried for idempotent methods. data may be a
+        callable returning the body, for streamed bodies that have to be produced
+        afresh on every attempt. authenticate=False sends the request without
+        logging in first or re-logging in on a 401.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        # Passed per request: REQUESTS_CA_BUNDLE/CURL_CA_BUNDLE would otherwise override session.verify.
+        kwargs.setdefault("verify", self.verify)
+        body = kwargs.pop("data", None)
+        url = path if path.startswith("http") else f"{self.base_url}{path}"
+        if authenticate and self.session_key is None:
+            self.login()
+        relogged = False
+        attempt = 0
+        started = time.monotonic()
+        while True:
+            key = self.session_key
+            kwargs["data"] = body() if callable(body) else body
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                retryable = method in IDEMPOTENT_METHODS or not isinstance(e, requests.ReadTimeout)
+                if attempt >= self.retries or not retryable:
+                    self._record(method, path, None, started, attempt + relogged)
+                    raise
+                logging.warning(f"{method} {url} failed ({e}); retrying")
+                self._sleep_before_retry(attempt)
+                attempt += 1
+                continue
+            if response.status_code == 401 and authenticate and not relogged:
+                # Session keys expire; log in again once and replay the request.
+                self.login(stale_key=key)
+                relogged = True
+                continue
+            if response.status_code in RETRY_STATUS and attempt < self.retries:
+                logging.warning(f"{method} {url} returned {response.status_code}; retrying")
+                self._sleep_before_retry(attempt, response)
+                attempt += 1
+                continue
+            self._record(method, path, response, started, attempt + relogged)
+            return response
+
+    def _record(self, method, path, response, started, retries):
+        if self.metrics is None:
+            return
+        if response is None:
+            self.metrics.record(self.host, method, path, None, time.monotonic() - started, retries=retries)
+            return
+        self.metrics.record(
+            self.host, method, path, response.status_code, time.monotonic() - started,
+            bytes_sent=int(response.request.headers.get("Content-Length") or 0),
+            bytes_received=len(response.content),
+            retries=retries,
+        )
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+
+def get_client(host, port, username, password, **kwargs):
+    """Returns the shared client for (host, port, username), creating it on first use."""
+    key = (host, str(port), username)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = SplunkRestClient(host, port, username, password, **kwargs)
+        return client
+
+
+class HostPools:
+    """Runs tasks on one thread pool per host: at most per_host at once on a host, at most workers overall.
+
+    Each host has its own threads, so a host at its per_host limit never ties up
+    a worker that another host could use.
+    """
+
+    def __init__(self, workers, per_host, thread_name_prefix="worker"):
+        self.per_host = max(1, min(per_host, workers))
+        self.thread_name_prefix = thread_name_prefix
+        self._slots = threading.BoundedSemaphore(max(1, workers))
+        self._pools = {}
+
+    def submit(self, host, fn, *args, **kwargs):
+        pool = self._pools.get(host)
+        if pool is None:
+            pool = self._pools[host] = ThreadPoolExecutor(
+                max_workers=self.per_host, thread_name_prefix=f"{self.thread_name_prefix}_{len(self._pools)}")
+        return pool.submit(self._run, fn, args, kwargs)
+
+    def _run(self, fn, args, kwargs):
+        with self._slots:
+            return fn(*args, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        for pool in self._pools.values():
+            pool.shutdown(wait=True)
@@ -7,14 +7,799 @@
 
 # Author's github: https://github.com/Asperheek/
 # Usage: ./pymongo_client.py 192.168.137.110 27017
+#        ./pymongo_client.py 192.168.137.110 27017 --export dump/ --batch-size 5000
+#        ./pymongo_client.py 192.168.137.110 27017 --export dump/ --projection '{"password": 0}'
+#        ./pymongo_client.py 192.168.137.110 27017 --export dump/ --workers 4 --split-size 512
+#        ./pymongo_client.py 192.168.137.110 27017 --export dump/ --resumable
+#        ./pymongo_client.py 192.168.137.110 27017 --export dump/ --incremental --since-field updated_at
+#        ./pymongo_client.py 192.168.137.110 27017 --export dump/ --format bson --compress gzip
+#        ./pymongo_client.py 192.168.137.110 27017 --restore dump/
+#        ./pymongo_client.py 192.168.137.110 27017 --survey > inventory.json
+#        ./pymongo_client.py 192.168.137.110 27017 --profile mydb.users --sample 100000 > schema.json
+#        ./pymongo_client.py 192.168.137.110 27017 --extract spec.yaml --export extract/
+
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import math
+import os
+import queue
+import shutil
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import sys
 import pymongo
+from bson import Decimal128, Int64, decode_file_iter, json_util
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+try:
+	import zstandard
+except ImportError:
+	zstandard = None
+
+try:
+	import yaml
+except ImportError:
+	yaml = None
+
+# Output format -> file extension, and compression -> extra suffix.
+FORMATS = {"ndjson": ".ndjson", "bson": ".bson"}
+COMPRESSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+# Sentinels telling the writer thread that the cursor is exhausted, or that it
+# should flush and report how far it got.
+_EOF = object()
+_FLUSH = object()
+
+
+def parse_args(argv=None):
+	parser = argparse.ArgumentParser(description="Automated mongodb data dump")
+	parser.add_argument("ip", help="MongoDB server address")
+	parser.add_argument("port", type=int, help="MongoDB server port")
+	parser.add_argument("--export", metavar="DIR",
+		help="stream every collection to DIR/<db>/<collection>.<format> instead of printing documents")
+	parser.add_argument("--batch-size", type=int, default=1000,
+		help="number of documents fetched per cursor round trip (default: 1000)")
+	parser.add_argument("--projection", type=json.loads, default=None,
+		help="JSON projection applied to every find(), e.g. '{\"_id\": 1, \"name\": 1}'")
+	parser.add_argument("--queue-size", type=int, default=10000,
+		help="maximum number of documents buffered between cursor and writer (default: 10000)")
+	parser.add_argument("--workers", type=int, default=1,
+		help="number of collections / _id ranges exported concurrently (default: 1)")
+	parser.add_argument("--split-size", type=int, default=1024, metavar="MB",
+		help="collections larger than this are split into _id ranges read on separate cursors (default: 1024)")
+	parser.add_argument("--resumable", action="store_true",
+		help="record a checkpoint so an interrupted export can be resumed; checkpointed exports read in "
+			"--since-field order instead of natural order. Implied by --checkpoint, --incremental, a --since-field "
+			"other than _id, or an existing DIR/checkpoint.json")
+	parser.add_argument("--checkpoint", metavar="FILE",
+		help="checkpoint file recording the last value written per collection (default: DIR/checkpoint.json)")
+	parser.add_argument("--incremental", action="store_true",
+		help="re-export collections already completed in the checkpoint, pulling only newer documents")
+	parser.add_argument("--since-field", default="_id",
+		help="field tracked in the checkpoint; exports are sorted on it (then _id) and resume after the last pair written (default: _id)")
+	parser.add_argument("--format", choices=sorted(FORMATS), default="ndjson",
+		help="ndjson decodes documents to extended JSON; bson writes the raw server bytes, mongorestore compatible (default: ndjson)")
+	parser.add_argument("--compress", choices=sorted(COMPRESSIONS), default="none",
+		help="compress exported files; gzip output can be read by 'mongorestore --gzip' (default: none)")
+	parser.add_argument("--restore", metavar="DIR",
+		help="load a --format bson export from DIR/<db>/<collection>.bson[.gz|.zst] into the server")
+	parser.add_argument("--survey", action="store_true",
+		help="print per-database/collection counts and sizes as JSON, using only server statistics")
+	parser.add_argument("--profile", nargs="*", metavar="DB.COLLECTION",
+		help="stream the given collections (all when none given) and print a field-level schema profile as JSON")
+	parser.add_argument("--sample", type=int, default=0,
+		help="profile a $sample of this many documents instead of the whole collection")
+	parser.add_argument("--max-fields", type=int, default=1000,
+		help="maximum number of distinct field paths tracked per collection while profiling (default: 1000)")
+	parser.add_argument("--extract", metavar="SPEC",
+		help="JSON/YAML file mapping db.collection to filter/projection/sort/limit; matching documents are "
+			"written to the --export directory (default: extract/)")
+	return parser.parse_args(argv)
+
+
+class Checkpoint(object):
+	"""Thread-safe record of the last value written for each db.collection (or _id range of one)."""
+
+	def __init__(self, path, interval=5.0):
+		self.path = path
+		self.interval = interval
+		self.lock = threading.Lock()
+		self.saved_at = 0.0
+		self.state = {}
+		if os.path.exists(path):
+			with open(path, encoding="utf-8") as f:
+				self.state = json_util.loads(f.read())
+
+	def get(self, key):
+		with self.lock:
+			return dict(self.state.get(key, {}))
+
+	def update(self, key, force=False, **values):
+		with self.lock:
+			self.state.setdefault(key, {}).update(values)
+			if force or time.time() - self.saved_at >= self.interval:
+				self._save()
+
+	def replace(self, key, value, drop=()):
+		with self.lock:
+			for k in drop:
+				self.state.pop(k, None)
+			self.state[key] = value
+			self._save()
+
+	def _save(self):
+		# Write-then-rename so a crash mid-save never leaves a truncated checkpoint.
+		tmp = self.path + ".tmp"
+		with open(tmp, "w", encoding="utf-8") as f:
+			f.write(json_util.dumps(self.state, indent=1))
+		os.replace(tmp, self.path)
+		self.saved_at = time.time()
+
+
+def _open_output(raw, compress="none"):
+	# Wraps an open binary file; closing the wrapper ends the gzip member / zstd frame but leaves raw open.
+	if compress == "gzip":
+		return gzip.GzipFile(fileobj=raw, mode="wb")
+	if compress == "zstd":
+		if zstandard is None:
+			raise RuntimeError("--compress zstd requires the zstandard package (pip install zstandard)")
+		return zstandard.ZstdCompressor().stream_writer(raw, closefd=False)
+	return raw
+
+
+def _open_input(path):
+	if path.endswith(".gz"):
+		return gzip.open(path, "rb")
+	if path.endswith(".zst"):
+		if zstandard is None:
+			raise RuntimeError("reading .zst files requires the zstandard package (pip install zstandard)")
+		# BufferedReader turns short reads at frame boundaries into the exact-size reads decode_file_iter expects.
+		return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True))
+	return open(path, "rb")
+
+
+def _encode_ndjson(doc):
+	return json_util.dumps(doc).encode("utf-8") + b"\n"
+
+
+def _encode_bson(doc):
+	# RawBSONDocument already holds the length-prefixed document exactly as the server sent it.
+	return doc.raw
+
+
+def _writer(path, mode, compress, encode, docs, errors, field, progress):
+	# Runs on the writer thread: encodes documents pulled from the queue and
+	# writes them to disk, so the cursor never blocks on serialization or I/O.
+	try:
+		last_doc = None
+		last = None
+		written = 0
+		with open(path, mode + "b") as raw:
+			f = None
+			try:
+				while True:
+					doc = docs.get()
+					if doc is _EOF:
+						break
+					if doc is _FLUSH:
+						if not written:
+							continue
+						# End the gzip member / zstd frame so the file is complete up to here, and only
+						# report progress once the preceding documents are out of our buffers. A resume
+						# truncates the file back to this offset.
+						if f is not raw:
+							f.close()
+							f = None
+						raw.flush()
+						# Look the fields up once per flush; for raw BSON this is the only decode we do.
+						last = last_doc.get(field, last)
+						progress(last, last_doc.get("_id"), written, raw.tell())
+						written = 0
+						continue
+					if f is None:
+						f = _open_output(raw, compress)
+					f.write(encode(doc))
+					last_doc = doc
+					written += 1
+			finally:
+				if f is not None and f is not raw:
+					f.close()
+	except Exception as e:
+		errors.append(e)
+		# Keep draining so the producer is never stuck on a full queue.
+		while docs.get() is not _EOF:
+			pass
+
+
+def _resume_query(field, last, last_id):
+	if field == "_id" or last_id is None:
+		return {field: {"$gt": last}}
+	return {"$or": [{field: {"$gt": last}}, {field: last, "_id": {"$gt": last_id}}]}
+
+
+def _track_field(projection, field):
+	# The checkpoint needs the tracked field, so make sure the projection keeps it.
+	if not projection:
+		return projection
+	projection = dict(projection)
+	if projection.get(field) in (0, False):
+		del projection[field]
+	elif field not in projection and any(v not in (0, False) for v in projection.values()):
+		projection[field] = 1
+	return projection
+
+
+def export_collection(collection, path, batch_size=1000, projection=None, queue_size=10000, query=None,
+		checkpoint=None, key=None, field="_id", fmt="ndjson", compress="none", sort=None, limit=0):
+	"""Streams one collection (or the part of it matching query) to a file and returns the number of documents written.
+
+	The bson format reads RawBSONDocument so documents are never decoded into
+	Python objects, only copied from the wire to the (optionally compressed) file.
+
+	With a checkpoint the cursor is sorted on (field, _id) and picks up after the
+	last pair recorded under key. The file is first truncated to the offset saved
+	with that pair, dropping anything written after the last checkpoint, and then
+	appended to.
+	"""
+	query = query or {}
+	mode = "w"
+	state = {"last": None, "last_id": None, "count": 0, "offset": 0}
+	if checkpoint is not None:
+		saved = checkpoint.get(key)
+		if saved.get("field", field) != field:
+			print("{}: checkpoint tracks '{}', not '{}'; exporting from scratch".format(key, saved["field"], field))
+		elif saved.get("last") is not None:
+			offset = saved.get("offset")
+			if offset is None or not os.path.exists(path) or os.path.getsize(path) < offset:
+				print("{}: {} does not match the checkpoint; exporting from scratch".format(key, path))
+			else:
+				os.truncate(path, offset)
+				state.update(saved)
+				cond = _resume_query(field, saved["last"], saved.get("last_id"))
+				query = {"$and": [query, cond]} if query else cond
+				mode = "a"
+		sort = [(field, pymongo.ASCENDING)]
+		if field != "_id":
+			# The field may repeat (timestamps); _id breaks ties so a resume neither skips nor repeats documents.
+			sort.append(("_id", pymongo.ASCENDING))
+			projection = _track_field(projection, "_id")
+		projection = _track_field(projection, field)
+
+	def progress(last, last_id, written, offset):
+		if last is not None:
+			state["last"] = last
+			state["last_id"] = last_id
+		state["count"] += written
+		state["offset"] = offset
+		if checkpoint is not None:
+			checkpoint.update(key, field=field, last=state["last"], last_id=state["last_id"], count=state["count"],
+				offset=state["offset"], complete=False)
+
+	encode = _encode_ndjson
+	if fmt == "bson":
+		collection = collection.with_options(codec_options=CodecOptions(document_class=RawBSONDocument))
+		encode = _encode_bson
+
+	docs = queue.Queue(maxsize=queue_size)
+	errors = []
+	writer = threading.Thread(target=_writer, args=(path, mode, compress, encode, docs, errors, field, progress),
+		daemon=True)
+	writer.start()
+	count = 0
+	try:
+		cursor = collection.find(query, projection, batch_size=batch_size, sort=sort, limit=limit)
+		if sort and sort != [("_id", pymongo.ASCENDING)]:
+			cursor = cursor.allow_disk_use(True)
+		for doc in cursor:
+			if errors:
+				break
+			docs.put(doc)
+			count += 1
+			if count % batch_size == 0:
+				docs.put(_FLUSH)
+	finally:
+		docs.put(_FLUSH)
+		docs.put(_EOF)
+		writer.join()
+	if errors:
+		raise errors[0]
+	if checkpoint is not None:
+		checkpoint.update(key, force=True, field=field, last=state["last"], last_id=state["last_id"],
+			count=state["count"], offset=state["offset"], complete=True)
+	return count
+
+
+def collection_size(dbx, name):
+	"""Returns the uncompressed data size of a collection in bytes, or 0 when collStats is not permitted."""
+	try:
+		return int(dbx.command("collStats", name).get("size", 0))
+	except pymongo.errors.PyMongoError:
+		return 0
+
+
+def split_points(dbx, name, parts, size):
+	"""Returns _id values splitting a collection into roughly equal ranges.
+
+	splitVector walks the _id index on the shard/replica and is cheap; when it is
+	unavailable (mongos, missing privileges) fall back to $bucketAuto on _id.
+	"""
+	try:
+		res = dbx.command("splitVector", dbx.name + "." + name, keyPattern={"_id": 1},
+			maxChunkSizeBytes=max(1, size // parts))
+		keys = [k["_id"] for k in res.get("splitKeys", [])]
+		if keys:
+			# splitVector may return more points than asked for; keep an evenly spaced subset.
+			step = max(1, len(keys) // (parts - 1)) if parts > 1 else len(keys)
+			return keys[step - 1::step][:parts - 1]
+	except pymongo.errors.PyMongoError:
+		pass
+	try:
+		buckets = dbx[name].aggregate([{"$bucketAuto": {"groupBy": "$_id", "buckets": parts}}], allowDiskUse=True)
+		return [b["_id"]["min"] for b in buckets][1:]
+	except pymongo.errors.PyMongoError:
+		return []
+
+
+def _id_type(value):
+	# Range queries compare numbers across int/long/double/decimal, so those count as one type.
+	if isinstance(value, (int, float, Int64, Decimal128)) and not isinstance(value, bool):
+		return "number"
+	return type(value)
+
+
+def uniform_id_type(dbx, name):
+	"""Tells whether the smallest and largest _id have the same BSON type.
+
+	$gte/$lt only match values of the bound's type, so a collection mixing, say,
+	ObjectId and string _ids would lose documents when split into _id ranges. BSON
+	sorts by type first, so matching ends mean every _id in between shares it.
+	"""
+	ends = [dbx[name].find_one({}, {"_id": 1}, sort=[("_id", direction)])
+		for direction in (pymongo.ASCENDING, pymongo.DESCENDING)]
+	if None in ends:
+		return True
+	return _id_type(ends[0]["_id"]) == _id_type(ends[1]["_id"])
+
+
+def _id_ranges(points):
+	bounds = [None] + list(points) + [None]
+	ranges = []
+	for lo, hi in zip(bounds, bounds[1:]):
+		cond = {}
+		if lo is not None:
+			cond["$gte"] = lo
+		if hi is not None:
+			cond["$lt"] = hi
+		ranges.append({"_id": cond} if cond else {})
+	return ranges
+
+
+def plan_exports(client, out_dir, workers=1, split_size=1024, checkpoint=None, field="_id"):
+	"""Builds the list of export tasks, one per collection or per _id range of a large collection."""
+	tasks = []
+	split_bytes = split_size * 1024 * 1024
+	for db in client.list_database_names():
+		dbx = client[db]
+		os.makedirs(os.path.join(out_dir, db), exist_ok=True)
+		for i in dbx.list_collection_names(include_system_collections=False):
+			name = db + "." + i
+			saved = checkpoint.get(name) if checkpoint is not None else {}
+			size = collection_size(dbx, i) if workers > 1 else 0
+			if "splits" in saved:
+				# An interrupted range-partitioned run: reuse its split points so part keys line up.
+				points = saved["splits"]
+			elif saved or field != "_id" or size <= split_bytes:
+				points = []
+			elif not uniform_id_type(dbx, i):
+				print("{}: _id values have mixed types; exporting on a single cursor".format(name))
+				points = []
+			else:
+				points = split_points(dbx, i, min(workers * 4, math.ceil(size / split_bytes)), size)
+				if points and checkpoint is not None:
+					checkpoint.replace(name, {"splits": points})
+			ranges = _id_ranges(points)
+			for n, query in enumerate(ranges):
+				tasks.append({
+					"db": db,
+					"collection": i,
+					"key": name if len(ranges) == 1 else "{}#{:04d}".format(name, n),
+					"part": n,
+					"parts": len(ranges),
+					"query": query,
+					"size": size // len(ranges),
+				})
+	# Start with the biggest pieces so one huge collection does not finish last.
+	tasks.sort(key=lambda t: t["size"], reverse=True)
+	return tasks
+
+
+def _task_path(out_dir, task, ext):
+	base = os.path.join(out_dir, task["db"], task["collection"])
+	if task["parts"] == 1:
+		return base + ext
+	return "{}.part{:04d}{}".format(base, task["part"], ext)
+
+
+def _merge_parts(out_dir, db, name, parts, ext):
+	# NDJSON lines, BSON documents, gzip members and zstd frames all concatenate
+	# cleanly, so stitch the parts back into one file per collection.
+	base = os.path.join(out_dir, db, name)
+	with open(base + ext, "wb") as out:
+		for n in range(parts):
+			part = "{}.part{:04d}{}".format(base, n, ext)
+			with open(part, "rb") as f:
+				shutil.copyfileobj(f, out, 1024 * 1024)
+			os.remove(part)
+
+
+def write_metadata(dbx, name, path, compress="none"):
+	# mongorestore picks up <collection>.metadata.json to recreate indexes; with
+	# --gzip it only reads .gz files, so the metadata is compressed along with the data.
+	if compress == "gzip":
+		path += ".gz"
+	with (gzip.open if compress == "gzip" else open)(path, "wt", encoding="utf-8") as f:
+		f.write(json_util.dumps({
+			"options": {},
+			"indexes": list(dbx[name].list_indexes()),
+			"collectionName": name,
+		}))
+
+
+def export_all(client, out_dir, batch_size=1000, projection=None, queue_size=10000, workers=1, split_size=1024,
+		checkpoint_path=None, incremental=False, field="_id", fmt="ndjson", compress="none", resumable=False):
+	ext = FORMATS[fmt] + COMPRESSIONS[compress]
+	os.makedirs(out_dir, exist_ok=True)
+	# A checkpoint sorts every cursor on the tracked field, so plain dumps skip it and keep natural-order scans.
+	default_checkpoint = os.path.join(out_dir, "checkpoint.json")
+	checkpoint = None
+	if resumable or checkpoint_path or incremental or field != "_id" or os.path.exists(default_checkpoint):
+		checkpoint = Checkpoint(checkpoint_path or default_checkpoint)
+	tasks = plan_exports(client, out_dir, workers, split_size, checkpoint, field)
+	totals = {}
+	failed = set()
+	with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+		futures = {}
+		for task in tasks:
+			key = (task["db"], task["collection"], task["parts"])
+			totals.setdefault(key, 0)
+			if checkpoint is not None and checkpoint.get(task["key"]).get("complete") and not incremental:
+				print("{}: already exported, skipping (use --incremental to pull new documents)".format(task["key"]))
+				continue
+			path = _task_path(out_dir, task, ext)
+			if fmt == "bson" and task["part"] == 0:
+				write_metadata(client[task["db"]], task["collection"],
+					os.path.join(out_dir, task["db"], task["collection"] + ".metadata.json"), compress)
+			future = pool.submit(export_collection, client[task["db"]][task["collection"]], path,
+				batch_size, projection, queue_size, task["query"], checkpoint, task["key"], field, fmt, compress)
+			futures[future] = (task, path)
+		for future in as_completed(futures):
+			task, path = futures[future]
+			key = (task["db"], task["collection"], task["parts"])
+			try:
+				count = future.result()
+			except Exception as e:
+				print("{}.{} part {}: export failed: {}".format(task["db"], task["collection"], task["part"], e))
+				failed.add(key)
+				continue
+			totals[key] += count
+			print("{}.{}: {} documents -> {}".format(task["db"], task["collection"], count, path))
+	for (db, name, parts), count in sorted(totals.items()):
+		if (db, name, parts) in failed:
+			continue
+		if parts > 1:
+			_merge_parts(out_dir, db, name, parts, ext)
+			print("{}.{}: {} documents merged from {} ranges".format(db, name, count, parts))
+			if checkpoint is None:
+				continue
+			# The merged file continues from the highest _id written by any range.
+			keys = ["{}.{}#{:04d}".format(db, name, n) for n in range(parts)]
+			states = [checkpoint.get(k) for k in keys]
+			last = next((st["last"] for st in reversed(states) if st.get("last") is not None), None)
+			checkpoint.replace(db + "." + name, {
+				"field": "_id",
+				"last": last,
+				"last_id": last,
+				"count": sum(st.get("count", 0) for st in states),
+				"offset": os.path.getsize(os.path.join(out_dir, db, name + ext)),
+				"complete": True,
+			}, drop=keys)
+
+
+def restore_all(client, in_dir, batch_size=1000):
+	"""Loads DIR/<db>/<collection>.bson[.gz|.zst] files written by --format bson back into the server."""
+	raw = CodecOptions(document_class=RawBSONDocument)
+	for db in sorted(os.listdir(in_dir)):
+		if not os.path.isdir(os.path.join(in_dir, db)):
+			continue
+		for filename in sorted(os.listdir(os.path.join(in_dir, db))):
+			name, sep, suffix = filename.partition(".bson")
+			if not sep or suffix not in COMPRESSIONS.values():
+				continue
+			collection = client[db][name]
+			inserted = 0
+			batch = []
+			with _open_input(os.path.join(in_dir, db, filename)) as f:
+				for doc in decode_file_iter(f, codec_options=raw):
+					batch.append(doc)
+					if len(batch) >= batch_size:
+						inserted += _insert_batch(collection, batch)
+						batch = []
+				if batch:
+					inserted += _insert_batch(collection, batch)
+			print("{}.{}: {} documents restored from {}".format(db, name, inserted, filename))
+
+
+def _insert_batch(collection, batch):
+	try:
+		return len(collection.insert_many(batch, ordered=False).inserted_ids)
+	except pymongo.errors.BulkWriteError as e:
+		# Documents already present (duplicate _id) are skipped, everything else is still inserted.
+		return e.details.get("nInserted", 0)
+
+
+def _collection_stats(dbx, name):
+	stats = {"name": name}
+	try:
+		stats["count"] = dbx[name].estimated_document_count()
+	except pymongo.errors.PyMongoError as e:
+		stats["error"] = str(e)
+		return stats
+	try:
+		cs = dbx.command("collStats", name)
+	except pymongo.errors.PyMongoError as e:
+		# Views and restricted users: the metadata count is still worth reporting.
+		stats["error"] = str(e)
+		return stats
+	stats.update({
+		"size": cs.get("size", 0),
+		"storageSize": cs.get("storageSize", 0),
+		"avgObjSize": cs.get("avgObjSize", 0),
+		"totalIndexSize": cs.get("totalIndexSize", 0),
+		"indexSizes": cs.get("indexSizes", {}),
+	})
+	return stats
+
+
+def _database_stats(client, db):
+	dbx = client[db]
+	stats = {"name": db}
+	try:
+		ds = dbx.command("dbStats")
+		for k in ("objects", "dataSize", "storageSize", "indexSize", "avgObjSize"):
+			stats[k] = ds.get(k, 0)
+	except pymongo.errors.PyMongoError as e:
+		stats["error"] = str(e)
+	stats["collections"] = [_collection_stats(dbx, i)
+		for i in dbx.list_collection_names(include_system_collections=False)]
+	return stats
+
+
+def survey(client, databases, workers=8):
+	"""Sizes every database and collection from dbStats/collStats without reading any documents."""
+	with ThreadPoolExecutor(max_workers=max(1, min(workers, len(databases) or 1))) as pool:
+		results = list(pool.map(lambda db: _database_stats(client, db), databases))
+	return {
+		"server": client.server_info().get("version"),
+		"databases": results,
+	}
+
+
+class HyperLogLog(object):
+	"""Fixed-size distinct-count sketch: 2**precision one-byte registers, ~1.6% error at the default precision."""
+
+	def __init__(self, precision=12):
+		self.p = precision
+		self.m = 1 << precision
+		self.registers = bytearray(self.m)
+
+	def add(self, value):
+		h = int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), "big")
+		index = h >> (64 - self.p)
+		rest = h & ((1 << (64 - self.p)) - 1)
+		rank = (64 - self.p) - rest.bit_length() + 1
+		if rank > self.registers[index]:
+			self.registers[index] = rank
+
+	def estimate(self):
+		alpha = 0.7213 / (1 + 1.079 / self.m)
+		raw = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+		zeros = self.registers.count(0)
+		if raw <= 2.5 * self.m and zeros:
+			# Linear counting is far more accurate for small cardinalities.
+			return int(round(self.m * math.log(float(self.m) / zeros)))
+		return int(round(raw))
+
+
+# Python types produced by the BSON decoder -> BSON type names.
+BSON_TYPES = {
+	"NoneType": "null",
+	"bool": "bool",
+	"int": "int",
+	"Int64": "long",
+	"float": "double",
+	"str": "string",
+	"dict": "object",
+	"SON": "object",
+	"list": "array",
+	"ObjectId": "objectId",
+	"datetime": "date",
+	"Decimal128": "decimal",
+	"bytes": "binData",
+	"Binary": "binData",
+	"UUID": "binData",
+	"Regex": "regex",
+	"Timestamp": "timestamp",
+	"Code": "javascript",
+	"MinKey": "minKey",
+	"MaxKey": "maxKey",
+	"DBRef": "dbPointer",
+}
+
+
+class SchemaProfile(object):
+	"""Streaming field-level profile of a collection whose memory does not grow with the number of documents."""
+
+	def __init__(self, max_fields=1000, precision=12):
+		self.max_fields = max_fields
+		self.precision = precision
+		self.documents = 0
+		self.fields = {}
+		self.untracked = 0
+
+	def add(self, doc):
+		self.documents += 1
+		self._walk(doc, "")
+
+	def _walk(self, doc, prefix):
+		for k, v in doc.items():
+			self._observe(prefix + k, v)
+
+	def _observe(self, path, value):
+		field = self.fields.get(path)
+		if field is None:
+			if len(self.fields) >= self.max_fields:
+				self.untracked += 1
+				return
+			field = self.fields[path] = {"count": 0, "nulls": 0, "types": Counter(), "hll": HyperLogLog(self.precision)}
+		field["count"] += 1
+		field["types"][BSON_TYPES.get(type(value).__name__, type(value).__name__)] += 1
+		if value is None:
+			field["nulls"] += 1
+		elif isinstance(value, dict):
+			self._walk(value, path + ".")
+		elif isinstance(value, list):
+			for item in value:
+				self._observe(path + "[]", item)
+		else:
+			field["hll"].add(repr(value).encode("utf-8", "backslashreplace"))
+
+	def report(self):
+		fields = {}
+		for path in sorted(self.fields):
+			field = self.fields[path]
+			# For array element paths ("tags[]") presence is values per document and can exceed 1.
+			fields[path] = {
+				"count": field["count"],
+				"presence": round(float(field["count"]) / self.documents, 4) if self.documents else 0,
+				"null_rate": round(float(field["nulls"]) / field["count"], 4),
+				"types": dict(field["types"].most_common()),
+				"distinct_estimate": field["hll"].estimate(),
+			}
+		return {"documents": self.documents, "untracked_values": self.untracked, "fields": fields}
+
+
+def profile_collection(collection, batch_size=1000, projection=None, sample=0, max_fields=1000):
+	"""Builds a SchemaProfile from a full scan, or a $sample, using the same cursor controls as the export path."""
+	if sample:
+		pipeline = [{"$sample": {"size": sample}}]
+		if projection:
+			pipeline.append({"$project": projection})
+		cursor = collection.aggregate(pipeline, batchSize=batch_size, allowDiskUse=True)
+	else:
+		cursor = collection.find({}, projection, batch_size=batch_size)
+	profile = SchemaProfile(max_fields)
+	for doc in cursor:
+		profile.add(doc)
+	return profile.report()
+
+
+def profile_all(client, databases, targets, batch_size=1000, projection=None, sample=0, max_fields=1000):
+	if not targets:
+		targets = [db + "." + i for db in databases
+			for i in client[db].list_collection_names(include_system_collections=False)]
+	results = {}
+	for target in targets:
+		db, _, name = target.partition(".")
+		results[target] = profile_collection(client[db][name], batch_size, projection, sample, max_fields)
+	return results
+
+
+def load_extract_spec(path):
+	"""Reads an extraction spec: {"db.collection": {"filter": {}, "projection": {}, "sort": [["f", -1]], "limit": 0}}.
+
+	Values go through extended JSON so {"$oid": ...} / {"$date": ...} work in both formats.
+	"""
+	with open(path, encoding="utf-8") as f:
+		text = f.read()
+	if path.endswith((".yaml", ".yml")):
+		if yaml is None:
+			raise RuntimeError("YAML specs require the PyYAML package (pip install pyyaml)")
+		return json_util.loads(json_util.dumps(yaml.safe_load(text)))
+	return json_util.loads(text)
+
+
+def _sort_spec(sort):
+	if not sort:
+		return None
+	if isinstance(sort, dict):
+		return list(sort.items())
+	return [tuple(item) for item in sort]
+
+
+def _plan_stages(plan):
+	# Walks a winningPlan tree and yields every stage name (FETCH, IXSCAN, COLLSCAN, ...).
+	if isinstance(plan, dict):
+		if "stage" in plan:
+			yield plan["stage"]
+		for k in ("inputStage", "queryPlan", "winningPlan"):
+			if k in plan:
+				for stage in _plan_stages(plan[k]):
+					yield stage
+		for child in plan.get("inputStages", []):
+			for stage in _plan_stages(child):
+				yield stage
+
+
+def check_query_plan(collection, query, sort=None):
+	"""Warns when a filter/sort cannot use an index; returns the winning plan's stage names."""
+	cursor = collection.find(query, sort=sort, limit=1)
+	stages = list(_plan_stages(cursor.explain().get("queryPlanner", {}).get("winningPlan", {})))
+	if "COLLSCAN" in stages:
+		indexes = ["{} {}".format(name, info["key"]) for name, info in collection.index_information().items()]
+		print("WARNING: {}.{} filter {} will scan the whole collection (COLLSCAN). Available indexes: {}".format(
+			collection.database.name, collection.name, json_util.dumps(query), ", ".join(indexes)))
+	return stages
+
+
+def extract_all(client, spec, out_dir, batch_size=1000, queue_size=10000, fmt="ndjson", compress="none"):
+	ext = FORMATS[fmt] + COMPRESSIONS[compress]
+	for target, options in spec.items():
+		db, _, name = target.partition(".")
+		collection = client[db][name]
+		query = options.get("filter", {})
+		sort = _sort_spec(options.get("sort"))
+		check_query_plan(collection, query, sort)
+		os.makedirs(os.path.join(out_dir, db), exist_ok=True)
+		path = os.path.join(out_dir, db, name + ext)
+		count = export_collection(collection, path, batch_size, options.get("projection"), queue_size, query,
+			fmt=fmt, compress=compress, sort=sort, limit=int(options.get("limit", 0)))
+		print("{}: {} documents -> {}".format(target, count, path))
+
 
 def main():
-	IP = str(sys.argv[1]) 
-	port = int(sys.argv[2])
+	args = parse_args()
+	IP = args.ip
+	port = args.port
 	client = pymongo.MongoClient(IP, port)
+	databases = client.list_database_names()
+
+# survey mode: machine-readable inventory only, so skip the banners.
+	if args.survey:
+		print(json_util.dumps(survey(client, databases, max(args.workers, 8)), indent=2))
+		return
+
+# profile mode: schema statistics as JSON, no banners either.
+	if args.profile is not None:
+		print(json.dumps(profile_all(client, databases, args.profile, args.batch_size, args.projection,
+			args.sample, args.max_fields), indent=2))
+		return
+
 	print("==========================Script v1.0==========================")
 	print("=======================Author: Asperheek=======================")
 # server_info() function to obtain the data about the MongoDB server instance.
@@ -23,19 +808,39 @@ def main():
 
 # list_database_names() to get a list of all the databases.
 	print("=======================List of Databases=======================")
-	print(client.list_database_names())
+	print(databases)
 
 # selecting the database and listing its collections.
 	print("==========================Collections==========================")
-	for db in client.list_database_names():
+	for db in databases:
 		database = client[db]
 		print("Collections of the database " + db + ":")
 		print(database.list_collection_names(include_system_collections=False))
 
+# extract mode: only the documents/fields named in the spec file.
+	if args.extract:
+		print("============================Extract============================")
+		extract_all(client, load_extract_spec(args.extract), args.export or "extract", args.batch_size,
+			args.queue_size, args.format, args.compress)
+		return
+
+# export mode: stream every collection to NDJSON files without prompting.
+	if args.export:
+		print("============================Export=============================")
+		export_all(client, args.export, args.batch_size, args.projection, args.queue_size,
+			args.workers, args.split_size, args.checkpoint, args.incremental, args.since_field,
+			args.format, args.compress, args.resumable)
+		return
+
+# restore mode: load a raw BSON export back into the server.
+	if args.restore:
+		print("============================Restore============================")
+		restore_all(client, args.restore, args.batch_size)
+		return
 
-	doc = raw_input("Do you want to continue by finding the documents inside the collections? y/n : ")
+	doc = input("Do you want to continue by finding the documents inside the collections? y/n : ")
 	if(doc == "y" or doc == "Y"):
-		for db in client.list_database_names():
+		for db in databases:
 			dbx = client[db]
 			col = dbx.list_collection_names(include_system_collections=False)
 			for i in col:
@@ -43,8 +848,8 @@ def main():
 				print(i)
 				print("===============================================================")
 				collection = dbx[i]
-				for docx in collection.find():
-					print(docx)		
+				for docx in collection.find(batch_size=args.batch_size):
+					print(docx)
 	else:
 		raise SystemExit
 